@@ -2,38 +2,122 @@
 
 import dash
 from dash import dcc, html
-from dash.dependencies import Input, Output
-import plotly.express as px
-import plotly.graph_objects as go
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
 import pandas as pd
 import numpy as np
 import dash_bootstrap_components as dbc
+import collections
+import functools
+import hashlib
+import os
+from flask import jsonify, request
 
-def load_and_clean_data(filepath):
-    df = pd.read_csv(filepath)
-    for col in ['Total', 'Men', 'Women']:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.replace(',', '').str.replace('"', '')
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    df = df.dropna(subset=['Total', 'Men', 'Women'])
-    return df
-
-def get_essential_services_data(df):
-    essential_services = ['police', 'firefighter', 'nurse']
-    pattern = '|'.join(essential_services)
-    essential_df = df[df['Occupation'].str.contains(pattern, case=False, na=False)]
-    return essential_df
-
-def get_noc_top_level_data(df):
-    pattern = r'^\d\s[A-Za-z]+'
-    top_level_df = df[df['Occupation'].str.match(pattern, na=False)]
-    return top_level_df
-
-def get_engineering_data(df):
-    engineering_occupations = ['computer engineer', 'mechanical engineer', 'electrical engineer']
-    pattern = '|'.join(engineering_occupations)
-    engineering_df = df[df['Occupation'].str.contains(pattern, case=False, na=False)]
-    return engineering_df
+import background_jobs
+import dataset_manager
+import exports
+import figure_builder
+import figure_cache
+import http_cache
+import ingest
+import metrics
+import occupation_search
+import prerender
+import snapshot
+
+ESSENTIAL_SERVICES = ['police', 'firefighter', 'nurse']
+SERVICE_FILTERS = {'police': 'police', 'fire': 'fire', 'nurse': 'nurse'}
+ENGINEERING_OCCUPATIONS = ['computer engineer', 'mechanical engineer', 'electrical engineer']
+ENGINEERING_TYPES = ['computer', 'mechanical', 'electrical']
+CATEGORY_FILTERS = {
+    "business": ["business", "finance", "administration"],
+    "science": ["natural", "applied sciences", "engineering"],
+    "health": ["health", "nurse", "medical"],
+    "education": ["education", "law", "social"],
+    "art": ["art", "culture", "recreation"]
+}
+PROVINCE_SPLIT_SEED = 2023
+NOC_SEARCH_LIMIT = 20
+ROOT_NODE = -1
+DATA_PATH = os.environ.get('DATA_PATH', 'data.csv')
+PRERENDER_DIR = os.environ.get('PRERENDER_DIR', prerender.DEFAULT_ROOT)
+INDEX_KEYWORDS = set(ESSENTIAL_SERVICES) | set(SERVICE_FILTERS.values()) | set(ENGINEERING_OCCUPATIONS) | set(ENGINEERING_TYPES) | {
+    keyword for keywords in CATEGORY_FILTERS.values() for keyword in keywords
+}
+
+# Hashed in fixed-size blocks so a reload never holds the whole extract.
+def dataset_version(filepath, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+def load_and_clean_data(filepath, version=None):
+    version = version or dataset_version(filepath)
+    path = snapshot.snapshot_path(filepath)
+    df, arrays = snapshot.read_snapshot(path, version)
+    if df is None:
+        df, arrays = clean_csv(filepath)
+        try:
+            snapshot.write_snapshot(df, path, version, arrays)
+            # Re-open it so the counts are read-only, file-backed pages that
+            # forked workers share instead of private heap copies.
+            df, arrays = snapshot.read_snapshot(path, version)
+        except OSError:
+            pass
+    return df, build_noc_index(df), arrays.get('province_totals')
+
+# Streams the CSV through the chunked ingest so only the per-occupation
+# aggregates are ever held, whatever the size of the extract.
+def clean_csv(filepath):
+    aggregates = ingest.aggregate_csv(filepath, int(os.environ.get('INGEST_CHUNKSIZE', ingest.DEFAULT_CHUNKSIZE)))
+    arrays = {}
+    totals = ingest.province_totals(aggregates, province_table['names'])
+    if totals is not None:
+        arrays['province_totals'] = totals
+    return ingest.national_frame(aggregates), arrays
+
+# Row ids are positions in the cleaned frame. The NOC code prefix encodes the
+# tree (0 -> 00 -> 000 -> 0001 -> 00010), so depth is the code length and the
+# parent is the longest existing code that prefixes it.
+def build_noc_index(df):
+    occupations = df['Occupation'].fillna('').astype(str).tolist()
+    codes = [occ.split(' ', 1)[0] if occ[:1].isdigit() else '' for occ in occupations]
+    row_by_code = {code: row for row, code in enumerate(codes) if code.isdigit()}
+    depth = np.array([len(code) if code in row_by_code else 0 for code in codes], dtype=np.int8)
+    parent = np.full(len(codes), -1, dtype=np.int32)
+    children = {}
+    for row, code in enumerate(codes):
+        for cut in range(len(code) - 1, 0, -1):
+            if code[:cut] in row_by_code:
+                parent[row] = row_by_code[code[:cut]]
+                children.setdefault(row_by_code[code[:cut]], []).append(row)
+                break
+    lowered = [occ.lower() for occ in occupations]
+    postings = {
+        keyword: np.array([row for row, occ in enumerate(lowered) if keyword in occ], dtype=np.int64)
+        for keyword in INDEX_KEYWORDS
+    }
+    return {
+        'codes': codes,
+        'row_by_code': row_by_code,
+        'depth': depth,
+        'parent': parent,
+        'children': children,
+        'postings': postings
+    }
+
+def lookup_rows(index, keywords, within=None):
+    rows = np.array([], dtype=np.int64)
+    for keyword in keywords:
+        rows = np.union1d(rows, index['postings'][keyword])
+    if within is not None:
+        rows = np.intersect1d(rows, within, assume_unique=True)
+    return rows
+
+def get_noc_top_level_data(df, index):
+    return df.iloc[np.flatnonzero(index['depth'] == 1)]
 
 def get_province_data():
     provinces = {
@@ -53,492 +137,986 @@ def get_province_data():
     }
     return provinces
 
-try:
-    df = load_and_clean_data('data.csv')
-except:
-    df = pd.DataFrame()
+# Resident (RSS) and proportional (PSS) set size in KB. PSS splits shared pages
+# between the processes mapping them, so summing it over workers gives the real
+# footprint of the pool.
+def process_memory(pid='self'):
+    memory = {'pid': os.getpid() if pid == 'self' else pid}
+    for filename, field, key in [('status', 'VmRSS:', 'rss_kb'), ('smaps_rollup', 'Pss:', 'pss_kb')]:
+        try:
+            with open('/proc/%s/%s' % (pid, filename)) as f:
+                for line in f:
+                    if line.startswith(field):
+                        memory[key] = int(line.split()[1])
+                        break
+        except OSError:
+            pass
+    return memory
+
+def child_pids(pid):
+    try:
+        with open('/proc/%d/task/%d/children' % (pid, pid)) as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    children = []
+    for entry in os.listdir('/proc'):
+        try:
+            with open('/proc/%s/stat' % entry) as f:
+                # ppid is the second field after the parenthesized command.
+                if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                    children.append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+    return children
+
+# Under gunicorn, the arbiter's pid (set in post_fork); its children are the
+# worker pool.
+pool_master = [None]
+
+def get_province_table(provinces):
+    population = np.array([p['Population'] for p in provinces.values()], dtype=np.float64)
+    return {
+        'names': pd.Index(list(provinces.keys())),
+        'population': population,
+        'share': population / population.sum()
+    }
+
+# Spreads each occupation's national total over the provinces in a single
+# broadcast: (occupations x 1) * (1 x provinces) * noise.
+def allocate_to_provinces(totals, table, low, high, rng):
+    noise = rng.uniform(low, high, size=(len(totals), len(table['names'])))
+    return (np.asarray(totals, dtype=np.float64)[:, None] * table['share'] * noise).astype(np.int64)
+
+# The provincial split is a model of the dataset, not of the request: it is
+# drawn once per dataset version from a fixed seed (or taken from a provided
+# Occupation,Province,Count breakdown, or from the extract itself when it has a
+# geography column) and callbacks only slice rows out of it.
+def build_province_split(df, index, table, breakdown_path=None, observed=None):
+    rng = np.random.default_rng(PROVINCE_SPLIT_SEED)
+    totals = df['Total'].to_numpy()
+    counts = allocate_to_provinces(totals, table, 0.8, 1.2, rng)
+    essential = lookup_rows(index, ESSENTIAL_SERVICES)
+    counts[essential] = allocate_to_provinces(totals[essential], table, 0.7, 1.3, rng)
+    if breakdown_path and os.path.exists(breakdown_path):
+        breakdown = pd.read_csv(breakdown_path, thousands=',')
+        rows = pd.Index(df['Occupation']).get_indexer(breakdown['Occupation'])
+        cols = table['names'].get_indexer(breakdown['Province'])
+        known = (rows >= 0) & (cols >= 0)
+        counts[rows[known], cols[known]] = breakdown['Count'].to_numpy()[known]
+    if observed is not None:
+        counts = np.where(observed >= 0, observed, counts)
+    counts.flags.writeable = False
+    return counts
+
+# Custom Insight aggregates per category: Men/Women sums by NOC depth (the code
+# length, which is what "hierarchy level" means in this data) and every row's
+# gender parity index with its rank inside the category.
+def build_insight_aggregates(df, index):
+    men = df['Men'].to_numpy(dtype=np.float64)
+    women = df['Women'].to_numpy(dtype=np.float64)
+    gpi = np.divide(women, men, out=np.full(len(df), np.inf), where=men > 0)
+    aggregates = {}
+    for category, keywords in CATEGORY_FILTERS.items():
+        rows = lookup_rows(index, keywords)
+        levels = pd.DataFrame({
+            'Level': index['depth'][rows].astype(np.int64),
+            'Men': men[rows],
+            'Women': women[rows]
+        }).groupby('Level').sum().reset_index()
+        levels['Total'] = levels['Men'] + levels['Women']
+        levels['Men_Pct'] = (levels['Men'] / levels['Total']) * 100
+        levels['Women_Pct'] = (levels['Women'] / levels['Total']) * 100
+        order = np.argsort(gpi[rows], kind='stable')
+        rank = np.empty(len(rows), dtype=np.int64)
+        rank[order] = np.arange(len(rows))
+        aggregates[category] = {'levels': levels, 'rows': rows, 'gpi': gpi[rows], 'rank': rank}
+    return aggregates
+
+# NOC drill-down: every node's immediate children, largest first. The census
+# rows for broad groups already carry the Men/Women/Total rollups of their
+# subtrees, so a request only ever touches one node's fan-out. ROOT_NODE holds
+# the top-level groups (and is also the parent of those groups in noc_index).
+def build_drilldown(df, index):
+    total = df['Total'].to_numpy(dtype=np.int64)
+    children = {ROOT_NODE: np.flatnonzero(index['depth'] == 1)}
+    for node, rows in index['children'].items():
+        children[node] = np.asarray(rows, dtype=np.int64)
+    fanout = np.zeros(len(df), dtype=np.int64)
+    for node, rows in children.items():
+        children[node] = rows[np.argsort(-total[rows], kind='stable')]
+        if node != ROOT_NODE:
+            fanout[node] = len(rows)
+    return {
+        'children': children,
+        'total': total,
+        'men': df['Men'].to_numpy(dtype=np.int64),
+        'women': df['Women'].to_numpy(dtype=np.int64),
+        'fanout': fanout
+    }
+
+def noc_path(occupations, index, node):
+    path = []
+    while node != ROOT_NODE:
+        path.append(occupations[node])
+        node = int(index['parent'][node])
+    return ' › '.join(['All occupations'] + path[::-1])
+
+# Rows holding the k lowest and k highest ranks, each block in ascending order,
+# without sorting the whole category.
+def select_extremes(ranks, k):
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    bottom = np.argpartition(ranks, k - 1)[:k]
+    top = np.argpartition(ranks, len(ranks) - k)[len(ranks) - k:]
+    return np.concatenate([bottom[np.argsort(ranks[bottom])], top[np.argsort(ranks[top])]])
+
+# One immutable, versioned snapshot of everything derived from the data file.
+# Callbacks read datasets.current once and use only that snapshot.
+Dataset = collections.namedtuple('Dataset', [
+    'version', 'df', 'noc_index', 'province_counts', 'essential_rows', 'engineering_rows',
+    'noc_top_level_df', 'insight_aggregates', 'drilldown', 'search_index', 'prerendered'
+])
+
+def derive_dataset(version, df, noc_index, observed=None):
+    return Dataset(
+        version=version,
+        df=df,
+        noc_index=noc_index,
+        province_counts=build_province_split(df, noc_index, province_table, os.environ.get('PROVINCE_BREAKDOWN_PATH'), observed),
+        essential_rows=lookup_rows(noc_index, ESSENTIAL_SERVICES),
+        engineering_rows=lookup_rows(noc_index, ENGINEERING_OCCUPATIONS),
+        noc_top_level_df=get_noc_top_level_data(df, noc_index),
+        insight_aggregates=build_insight_aggregates(df, noc_index),
+        drilldown=build_drilldown(df, noc_index),
+        search_index=occupation_search.build(df['Occupation'].tolist(), noc_index['codes'], noc_index['depth'], df['Total']),
+        # Payloads from `python prerender.py` for this version, if it was run.
+        prerendered=prerender.load(PRERENDER_DIR, version)
+    )
+
+def build_dataset(filepath):
+    version = dataset_version(filepath)
+    df, noc_index, observed = load_and_clean_data(filepath, version)
+    return derive_dataset(version, df, noc_index, observed)
+
+def empty_dataset():
+    df = pd.DataFrame({
+        'Occupation': pd.Series([], dtype=object),
+        'Total': pd.Series([], dtype=np.int64),
+        'Men': pd.Series([], dtype=np.int64),
+        'Women': pd.Series([], dtype=np.int64)
+    })
+    return derive_dataset('empty', df, build_noc_index(df))
 
 provinces = get_province_data()
-essential_services_df = get_essential_services_data(df)
-noc_top_level_df = get_noc_top_level_data(df)
-engineering_df = get_engineering_data(df)
+province_table = get_province_table(provinces)
+datasets = dataset_manager.DatasetManager(
+    DATA_PATH, build_dataset, empty_dataset,
+    interval=float(os.environ.get('DATA_WATCH_INTERVAL', '10'))
+)
+
+# Optional local job queue for heavy callbacks (None without dash[diskcache]).
+background_manager = background_jobs.make_manager(lambda: datasets.current.version)
 
 app = dash.Dash(
     __name__, 
+    compress=True,
+    background_callback_manager=background_manager,
     external_stylesheets=[dbc.themes.BOOTSTRAP],
     meta_tags=[{"name": "viewport", "content": "width=device-width, initial-scale=1"}]
 )
 server = app.server
+figures = figure_cache.from_env(
+    version=lambda: datasets.current.version,
+    prerendered=lambda: datasets.current.prerendered
+)
+# ETags / 304s for the page, layout and synchronous callback responses.
+http_cache.install(app, version=lambda: datasets.current.version)
+
+@server.route('/_cache/stats')
+def cache_stats():
+    return jsonify(dict(figures.stats(), http=http_cache.stats()))
+
+@server.route('/_figures/sizes')
+def figure_sizes():
+    return jsonify(figure_builder.size_report())
+
+@server.route('/metrics')
+def prometheus_metrics():
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@server.route('/_metrics/profiles')
+def slowest_profiles():
+    if metrics.sampler is None:
+        return 'profiling is off; set PROFILE_SLOWEST=N to keep the N slowest callbacks\n', 404, {'Content-Type': 'text/plain'}
+    return metrics.sampler.report(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+@server.route('/_admin/dataset')
+def dataset_status():
+    return jsonify(datasets.status())
 
-app.layout = dbc.Container([
-    dbc.Row([
-        dbc.Col([
-            html.H1("2023 Canadian Employment Data Dashboard", className="text-center"),
-            html.P("Interactive visualization of employment statistics", className="text-center")
-        ], width=12)
-    ], className="mt-4 mb-4"),
+# Disabled unless ADMIN_TOKEN is set; call with "Authorization: Bearer <token>".
+@server.route('/_admin/reload', methods=['POST'])
+def reload_dataset():
+    token = os.environ.get('ADMIN_TOKEN')
+    if not token:
+        return jsonify({'error': 'reload route disabled, set ADMIN_TOKEN'}), 404
+    if request.headers.get('Authorization') != 'Bearer ' + token:
+        return jsonify({'error': 'unauthorized'}), 401
+    datasets.request_reload()
+    return jsonify(datasets.status()), 202
+
+# This worker's memory, plus under gunicorn every worker's and the pool total,
+# so one request gives the figures for sizing the pool.
+@server.route('/_workers/memory')
+def worker_memory():
+    memory = process_memory()
+    if pool_master[0] is not None:
+        workers = [process_memory(pid) for pid in sorted(child_pids(pool_master[0]))]
+        memory['pool'] = {
+            'master': process_memory(pool_master[0]),
+            'workers': workers,
+            'worker_rss_kb': sum(w.get('rss_kb', 0) for w in workers),
+            'worker_pss_kb': sum(w.get('pss_kb', 0) for w in workers)
+        }
+    return jsonify(memory)
+
+# Derived tables behind the charts, streamed by exports.py. Filters use the
+# dashboard's input values; a repeated or comma-separated parameter selects
+# several. Each function validates its filters up front and returns
+# (columns, batches); the batches only run while the response is being sent,
+# on the dataset snapshot that was current when the request came in.
+
+def export_values(args, name, allowed):
+    values = [v.strip() for value in args.getlist(name) for v in value.split(',') if v.strip()]
+    unknown = [v for v in values if v not in allowed]
+    if unknown:
+        raise ValueError('unknown %s: %s' % (name, ', '.join(unknown)))
+    return values
+
+def export_province_allocation(data, args):
+    services = export_values(args, 'service', ['all'] + list(SERVICE_FILTERS))
+    types = export_values(args, 'engineering', ENGINEERING_TYPES)
+    wanted = export_values(args, 'province', province_table['names'])
+    if services or types:
+        # The union of the selected Essential Services and Engineering rows.
+        keywords = [SERVICE_FILTERS[s] for s in services if s != 'all']
+        rows = data.essential_rows if 'all' in services else lookup_rows(data.noc_index, keywords, within=data.essential_rows)
+        rows = np.union1d(rows, lookup_rows(data.noc_index, types, within=data.engineering_rows))
+    else:
+        rows = np.arange(len(data.df))
+    columns = province_table['names'].get_indexer(wanted) if wanted else np.arange(len(province_table['names']))
+    names = province_table['names'].to_numpy()[columns]
+    population = province_table['population'][columns]
+    occupations = data.df['Occupation'].to_numpy()
     
-    dbc.Tabs([
-        dbc.Tab(label="Essential Services", children=[
-            dbc.Row([
-                dbc.Col([
-                    html.H3("Essential Services Distribution", className="mt-3"),
-                    html.P("Police, firefighters, and nurses across provinces")
-                ], width=12)
-            ]),
-            
-            dbc.Row([
-                dbc.Col([
-                    html.Label("Select Service:"),
-                    dcc.Dropdown(
-                        id="service-type-dropdown",
-                        options=[
-                            {"label": "All Essential Services", "value": "all"},
-                            {"label": "Police Officers", "value": "police"},
-                            {"label": "Firefighters", "value": "fire"},
-                            {"label": "Registered Nurses", "value": "nurse"}
-                        ],
-                        value="all",
-                        clearable=False
-                    )
-                ], width=4),
-                
-                dbc.Col([
-                    html.Label("View Mode:"),
-                    dcc.RadioItems(
-                        id="normalization-radio",
-                        options=[
-                            {"label": "Absolute Numbers", "value": "absolute"},
-                            {"label": "Per 10,000 Population", "value": "normalized"}
-                        ],
-                        value="absolute",
-                        inline=True
-                    )
-                ], width=4),
-                
-                dbc.Col([
-                    html.Label("Sort By:"),
-                    dcc.Dropdown(
-                        id="sort-dropdown",
-                        options=[
-                            {"label": "Province (A-Z)", "value": "province"},
-                            {"label": "Count (High-Low)", "value": "count_desc"},
-                            {"label": "Count (Low-High)", "value": "count_asc"}
-                        ],
-                        value="count_desc",
-                        clearable=False
-                    )
-                ], width=4)
-            ], className="mb-4"),
-            
-            dbc.Row([
-                dbc.Col([
-                    dcc.Graph(id="essential-services-graph")
-                ], width=12)
-            ])
+    def batches():
+        per_batch = max(1, exports.BATCH_ROWS // max(1, len(columns)))
+        for start, stop in exports.batched(len(rows), per_batch):
+            block = rows[start:stop]
+            counts = data.province_counts[np.ix_(block, columns)]
+            yield {
+                'occupation': np.repeat(occupations[block], len(columns)),
+                'province': np.tile(names, len(block)),
+                'count': counts.ravel(),
+                'per10k': (counts / population * 10000).ravel()
+            }
+    return [('occupation', 'string'), ('province', 'string'), ('count', 'int64'), ('per10k', 'float64')], batches()
+
+def export_gender_by_depth(data, args):
+    categories = export_values(args, 'category', CATEGORY_FILTERS) or list(CATEGORY_FILTERS)
+    
+    def batches():
+        for category in categories:
+            levels = data.insight_aggregates[category]['levels']
+            yield {
+                'category': [category] * len(levels),
+                'level': levels['Level'].to_numpy(),
+                'men': levels['Men'].to_numpy(dtype=np.int64),
+                'women': levels['Women'].to_numpy(dtype=np.int64),
+                'total': levels['Total'].to_numpy(dtype=np.int64),
+                'men_pct': levels['Men_Pct'].to_numpy(),
+                'women_pct': levels['Women_Pct'].to_numpy()
+            }
+    return [
+        ('category', 'string'), ('level', 'int64'), ('men', 'int64'), ('women', 'int64'),
+        ('total', 'int64'), ('men_pct', 'float64'), ('women_pct', 'float64')
+    ], batches()
+
+def export_gpi_rankings(data, args):
+    categories = export_values(args, 'category', CATEGORY_FILTERS) or list(CATEGORY_FILTERS)
+    order = export_values(args, 'order', ['asc', 'desc'])
+    if len(order) > 1:
+        raise ValueError('order takes one value, got: %s' % ', '.join(order))
+    descending = order == ['desc']
+    occupations = data.df['Occupation'].to_numpy()
+    men = data.df['Men'].to_numpy(dtype=np.int64)
+    women = data.df['Women'].to_numpy(dtype=np.int64)
+    
+    def batches():
+        for category in categories:
+            aggregates = data.insight_aggregates[category]
+            # rank is a permutation, so inverting it orders the rows in O(n).
+            ranked = np.empty_like(aggregates['rank'])
+            ranked[aggregates['rank']] = np.arange(len(ranked))
+            if descending:
+                ranked = ranked[::-1]
+            for start, stop in exports.batched(len(ranked)):
+                picked = ranked[start:stop]
+                rows = aggregates['rows'][picked]
+                yield {
+                    'category': [category] * len(picked),
+                    'rank': aggregates['rank'][picked] + 1,
+                    'occupation': occupations[rows],
+                    'men': men[rows],
+                    'women': women[rows],
+                    'gpi': aggregates['gpi'][picked]
+                }
+    return [
+        ('category', 'string'), ('rank', 'int64'), ('occupation', 'string'),
+        ('men', 'int64'), ('women', 'int64'), ('gpi', 'float64')
+    ], batches()
+
+EXPORT_TABLES = {
+    'province-allocation': (export_province_allocation, ['service', 'engineering', 'province']),
+    'gender-by-depth': (export_gender_by_depth, ['category']),
+    'gpi-rankings': (export_gpi_rankings, ['category', 'order'])
+}
+
+@server.route('/export')
+def export_index():
+    return jsonify({
+        name: {'formats': list(exports.FORMATS), 'filters': filters}
+        for name, (_, filters) in EXPORT_TABLES.items()
+    })
+
+@server.route('/export/<name>.<fmt>')
+def export_table(name, fmt):
+    if name not in EXPORT_TABLES or fmt not in exports.FORMATS:
+        return jsonify(error='unknown export %s.%s' % (name, fmt)), 404
+    try:
+        columns, batches = EXPORT_TABLES[name][0](datasets.current, request.args)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return exports.stream(name, fmt, columns, batches)
+
+# Tab subtrees. Only the active tab is in the initial layout; the others are
+# inserted the first time a session selects them, and their callbacks fire
+# then, so a new session costs one tab's callbacks instead of all of them.
+
+def essential_services_tab(data):
+    return [
+        dbc.Row([
+            dbc.Col([
+                html.H3("Essential Services Distribution", className="mt-3"),
+                html.P("Police, firefighters, and nurses across provinces")
+            ], width=12)
         ]),
-        
-        dbc.Tab(label="Gender Employment", children=[
-            dbc.Row([
-                dbc.Col([
-                    html.H3("Gender Employment Statistics", className="mt-3"),
-                    html.P("Top-level NOC category employment by gender")
-                ], width=12)
-            ]),
-            
-            dbc.Row([
-                dbc.Col([
-                    html.Label("Select NOC Categories:"),
-                    dcc.Dropdown(
-                        id="noc-dropdown",
-                        options=[{"label": occ, "value": occ} for occ in noc_top_level_df['Occupation'].unique()],
-                        value=noc_top_level_df['Occupation'].unique()[:3].tolist(),
-                        multi=True
-                    )
-                ], width=6),
-                
-                dbc.Col([
-                    html.Label("Chart Type:"),
-                    dcc.RadioItems(
-                        id="chart-type-radio",
-                        options=[
-                            {"label": "Stacked Bar", "value": "stack"},
-                            {"label": "Grouped Bar", "value": "group"},
-                            {"label": "Gender Ratio", "value": "ratio"}
-                        ],
-                        value="stack",
-                        inline=True
-                    )
-                ], width=6)
-            ], className="mb-4"),
-            
-            dbc.Row([
-                dbc.Col([
-                    dcc.Graph(id="gender-employment-graph")
-                ], width=12)
-            ])
+    
+        dbc.Row([
+            dbc.Col([
+                html.Label("Select Service:"),
+                dcc.Dropdown(
+                    id="service-type-dropdown",
+                    options=[
+                        {"label": "All Essential Services", "value": "all"},
+                        {"label": "Police Officers", "value": "police"},
+                        {"label": "Firefighters", "value": "fire"},
+                        {"label": "Registered Nurses", "value": "nurse"}
+                    ],
+                    value="all",
+                    clearable=False
+                )
+            ], width=4),
+    
+            dbc.Col([
+                html.Label("View Mode:"),
+                dcc.RadioItems(
+                    id="normalization-radio",
+                    options=[
+                        {"label": "Absolute Numbers", "value": "absolute"},
+                        {"label": "Per 10,000 Population", "value": "normalized"}
+                    ],
+                    value="absolute",
+                    inline=True
+                )
+            ], width=4),
+    
+            dbc.Col([
+                html.Label("Sort By:"),
+                dcc.Dropdown(
+                    id="sort-dropdown",
+                    options=[
+                        {"label": "Province (A-Z)", "value": "province"},
+                        {"label": "Count (High-Low)", "value": "count_desc"},
+                        {"label": "Count (Low-High)", "value": "count_asc"}
+                    ],
+                    value="count_desc",
+                    clearable=False
+                )
+            ], width=4)
+        ], className="mb-4"),
+    
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id="essential-services-graph"),
+                dcc.Store(id="essential-services-data")
+            ], width=12)
+        ])
+    ]
+
+def gender_employment_tab(data):
+    return [
+        dbc.Row([
+            dbc.Col([
+                html.H3("Gender Employment Statistics", className="mt-3"),
+                html.P("Top-level NOC category employment by gender")
+            ], width=12)
         ]),
-        
-        dbc.Tab(label="Engineering Workforce", children=[
-            dbc.Row([
-                dbc.Col([
-                    html.H3("Engineering Workforce", className="mt-3"),
-                    html.P("Computer, mechanical, and electrical engineers by province")
-                ], width=12)
-            ]),
-            
-            dbc.Row([
-                dbc.Col([
-                    html.Label("Engineering Types:"),
-                    dcc.Checklist(
-                        id="engineering-checklist",
-                        options=[
-                            {"label": "Computer Engineers", "value": "computer"},
-                            {"label": "Mechanical Engineers", "value": "mechanical"},
-                            {"label": "Electrical Engineers", "value": "electrical"}
-                        ],
-                        value=["computer", "mechanical", "electrical"],
-                        inline=True
-                    )
-                ], width=6),
-                
-                dbc.Col([
-                    html.Label("View Mode:"),
-                    dcc.RadioItems(
-                        id="engineering-view-radio",
-                        options=[
-                            {"label": "Absolute Numbers", "value": "absolute"},
-                            {"label": "Per 10,000 Population", "value": "per_capita"}
-                        ],
-                        value="absolute",
-                        inline=True
-                    )
-                ], width=6)
-            ], className="mb-4"),
-            
-            dbc.Row([
-                dbc.Col([
-                    dcc.Graph(id="engineering-manpower-graph")
-                ], width=12)
-            ])
+    
+        dbc.Row([
+            dbc.Col([
+                html.Label("Select NOC Categories:"),
+                dcc.Dropdown(
+                    id="noc-dropdown",
+                    options=[{"label": occ, "value": occ} for occ in data.noc_top_level_df['Occupation'].unique()],
+                    value=data.noc_top_level_df['Occupation'].unique()[:3].tolist(),
+                    multi=True
+                )
+            ], width=6),
+    
+            dbc.Col([
+                html.Label("Chart Type:"),
+                dcc.RadioItems(
+                    id="chart-type-radio",
+                    options=[
+                        {"label": "Stacked Bar", "value": "stack"},
+                        {"label": "Grouped Bar", "value": "group"},
+                        {"label": "Gender Ratio", "value": "ratio"}
+                    ],
+                    value="stack",
+                    inline=True
+                )
+            ], width=6)
+        ], className="mb-4"),
+    
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id="gender-employment-graph"),
+                dcc.Store(id="gender-employment-data")
+            ], width=12)
+        ])
+    ]
+
+def noc_explorer_tab(data):
+    return [
+        dbc.Row([
+            dbc.Col([
+                html.H3("Occupation Hierarchy Explorer", className="mt-3"),
+                html.P("Click a group to load its sub-groups")
+            ], width=12)
         ]),
-        
-        dbc.Tab(label="Custom Insight", children=[
-            dbc.Row([
-                dbc.Col([
-                    html.H3("Occupation Hierarchy Analysis", className="mt-3"),
-                    html.P("Gender distribution across occupation levels")
-                ], width=12)
-            ]),
-            
-            dbc.Row([
-                dbc.Col([
-                    html.Label("Select Category:"),
-                    dcc.Dropdown(
-                        id="occupation-category-dropdown",
-                        options=[
-                            {"label": "Business & Finance", "value": "business"},
-                            {"label": "Sciences & Engineering", "value": "science"},
-                            {"label": "Health", "value": "health"},
-                            {"label": "Education & Law", "value": "education"},
-                            {"label": "Art & Culture", "value": "art"}
-                        ],
-                        value="science",
-                        clearable=False
-                    )
-                ], width=6),
-                
-                dbc.Col([
-                    html.Label("Analysis Type:"),
-                    dcc.RadioItems(
-                        id="analysis-type-radio",
-                        options=[
-                            {"label": "Hierarchy Level", "value": "hierarchy"},
-                            {"label": "Gender Parity", "value": "parity"}
-                        ],
-                        value="hierarchy",
-                        inline=True
-                    )
-                ], width=6)
-            ], className="mb-4"),
-            
-            dbc.Row([
-                dbc.Col([
-                    dcc.Graph(id="custom-insight-graph")
-                ], width=12)
-            ])
+    
+        dbc.Row([
+            dbc.Col([
+                dbc.Button("Up one level", id="noc-drilldown-up", color="secondary", outline=True, size="sm"),
+                dcc.Graph(id="noc-drilldown-graph"),
+                dcc.Store(id="noc-drilldown-node", data=ROOT_NODE)
+            ], width=12)
         ])
-    ]),
+    ]
+
+def engineering_workforce_tab(data):
+    return [
+        dbc.Row([
+            dbc.Col([
+                html.H3("Engineering Workforce", className="mt-3"),
+                html.P("Computer, mechanical, and electrical engineers by province")
+            ], width=12)
+        ]),
+    
+        dbc.Row([
+            dbc.Col([
+                html.Label("Engineering Types:"),
+                dcc.Checklist(
+                    id="engineering-checklist",
+                    options=[
+                        {"label": "Computer Engineers", "value": "computer"},
+                        {"label": "Mechanical Engineers", "value": "mechanical"},
+                        {"label": "Electrical Engineers", "value": "electrical"}
+                    ],
+                    value=["computer", "mechanical", "electrical"],
+                    inline=True
+                )
+            ], width=6),
+    
+            dbc.Col([
+                html.Label("View Mode:"),
+                dcc.RadioItems(
+                    id="engineering-view-radio",
+                    options=[
+                        {"label": "Absolute Numbers", "value": "absolute"},
+                        {"label": "Per 10,000 Population", "value": "per_capita"}
+                    ],
+                    value="absolute",
+                    inline=True
+                )
+            ], width=6)
+        ], className="mb-4"),
+    
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id="engineering-manpower-graph"),
+                dcc.Store(id="engineering-manpower-data")
+            ], width=12)
+        ])
+    ]
+
+def custom_insight_tab(data):
+    return [
+        dbc.Row([
+            dbc.Col([
+                html.H3("Occupation Hierarchy Analysis", className="mt-3"),
+                html.P("Gender distribution across occupation levels")
+            ], width=12)
+        ]),
+    
+        dbc.Row([
+            dbc.Col([
+                html.Label("Select Category:"),
+                dcc.Dropdown(
+                    id="occupation-category-dropdown",
+                    options=[
+                        {"label": "Business & Finance", "value": "business"},
+                        {"label": "Sciences & Engineering", "value": "science"},
+                        {"label": "Health", "value": "health"},
+                        {"label": "Education & Law", "value": "education"},
+                        {"label": "Art & Culture", "value": "art"}
+                    ],
+                    value="science",
+                    clearable=False
+                )
+            ], width=6),
     
-    html.Footer([
-        html.P("Data Source: 2023 Statistics Canada Census", className="text-center mt-4 text-muted")
-    ])
-], fluid=True)
+            dbc.Col([
+                html.Label("Analysis Type:"),
+                dcc.RadioItems(
+                    id="analysis-type-radio",
+                    options=[
+                        {"label": "Hierarchy Level", "value": "hierarchy"},
+                        {"label": "Gender Parity", "value": "parity"}
+                    ],
+                    value="hierarchy",
+                    inline=True
+                )
+            ], width=6)
+        ], className="mb-4"),
+    
+        dbc.Row([
+            dbc.Col([
+                html.Progress(id="custom-insight-progress", style={"visibility": "hidden"}),
+                dcc.Graph(id="custom-insight-graph"),
+                dcc.Store(id="custom-insight-rendered")
+            ], width=12)
+        ])
+    ]
+
+TABS = [
+    ("essential-services", "Essential Services", essential_services_tab),
+    ("gender-employment", "Gender Employment", gender_employment_tab),
+    ("noc-explorer", "NOC Explorer", noc_explorer_tab),
+    ("engineering-workforce", "Engineering Workforce", engineering_workforce_tab),
+    ("custom-insight", "Custom Insight", custom_insight_tab)
+]
+FIRST_TAB = TABS[0][0]
+
+# Memoizes a layout builder per dataset version. The snapshot itself is passed
+# in, so what gets cached under a version is always built from that version even
+# if a reload swaps datasets.current in the meantime.
+def by_version(maxsize):
+    def decorate(func):
+        built = collections.OrderedDict()
+        @functools.wraps(func)
+        def cached(data, *args):
+            key = (data.version,) + args
+            if key not in built:
+                built[key] = func(data, *args)
+                while len(built) > maxsize:
+                    built.popitem(last=False)
+            return built[key]
+        return cached
+    return decorate
+
+# Rebuilt only when the dataset version changes (the NOC options come from it).
+@by_version(maxsize=16)
+def build_tab(data, tab_id):
+    builder = {tab: builder for tab, _, builder in TABS}[tab_id]
+    return builder(data)
+
+@by_version(maxsize=2)
+def build_layout(data):
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col([
+                html.H1("2023 Canadian Employment Data Dashboard", className="text-center"),
+                html.P("Interactive visualization of employment statistics", className="text-center")
+            ], width=12)
+        ], className="mt-4 mb-4"),
+    
+        dbc.Tabs([
+            dbc.Tab(
+                html.Div(build_tab(data, tab_id) if tab_id == FIRST_TAB else [], id="%s-tab" % tab_id),
+                label=label,
+                tab_id=tab_id
+            )
+            for tab_id, label, _ in TABS
+        ], id="dashboard-tabs", active_tab=FIRST_TAB),
+        dcc.Store(id="rendered-tabs", data=[FIRST_TAB]),
+    
+        html.Footer([
+            html.P("Data Source: 2023 Statistics Canada Census", className="text-center mt-4 text-muted")
+        ])
+    ], fluid=True)
+
+def serve_layout():
+    return build_layout(datasets.current)
+
+app.layout = serve_layout
+# Every tab's components, so Dash can still validate callback ids up front.
+app.validation_layout = html.Div(
+    [build_layout(datasets.current)] + [build_tab(datasets.current, tab_id) for tab_id, _, _ in TABS[1:]]
+)
 
 @app.callback(
+    [Output("%s-tab" % tab_id, "children") for tab_id, _, _ in TABS] + [Output("rendered-tabs", "data")],
+    Input("dashboard-tabs", "active_tab"),
+    State("rendered-tabs", "data"),
+    prevent_initial_call=True
+)
+def render_active_tab(active_tab, rendered):
+    rendered = rendered or []
+    if active_tab in rendered or active_tab not in [tab_id for tab_id, _, _ in TABS]:
+        raise PreventUpdate
+    data = datasets.current
+    children = [build_tab(data, tab_id) if tab_id == active_tab else dash.no_update for tab_id, _, _ in TABS]
+    return children + [rendered + [active_tab]]
+
+# The Essential Services, Gender and Engineering tabs are split in two: a
+# server callback that runs only when the row selection changes and writes the
+# numbers to a dcc.Store, and a clientside renderer (assets/dashboard.js) that
+# applies the view-mode, sort and chart-type toggles in the browser.
+
+@app.callback(
+    Output("essential-services-data", "data"),
+    Input("service-type-dropdown", "value")
+)
+@metrics.instrument("essential-services-data")
+@figures.memoize("essential-services-data")
+@figure_builder.measured("essential-services-data")
+def update_essential_services_data(service_type):
+    data = datasets.current
+    with metrics.stage('filter'):
+        if service_type == "all":
+            rows = data.essential_rows
+        else:
+            rows = lookup_rows(data.noc_index, [SERVICE_FILTERS[service_type]], within=data.essential_rows)
+    metrics.observe_rows(len(rows))
+    
+    with metrics.stage('allocate'):
+        counts = data.province_counts[rows].sum(axis=0)
+    with metrics.stage('build'):
+        return {
+            'title': f'Essential Services Distribution ({service_type.title()})',
+            'province': province_table['names'].tolist(),
+            'count': figure_builder.typed_array(counts),
+            'per10k': figure_builder.typed_array(counts / province_table['population'] * 10000)
+        }
+
+app.clientside_callback(
+    ClientsideFunction(namespace="dashboard", function_name="renderEssentialServices"),
     Output("essential-services-graph", "figure"),
     [
-        Input("service-type-dropdown", "value"),
+        Input("essential-services-data", "data"),
         Input("normalization-radio", "value"),
         Input("sort-dropdown", "value")
     ]
 )
-def update_essential_services_graph(service_type, normalization, sort_by):
-    if service_type == "all":
-        filtered_df = essential_services_df.copy()
-    elif service_type == "police":
-        filtered_df = essential_services_df[essential_services_df['Occupation'].str.contains('police', case=False, na=False)]
-    elif service_type == "fire":
-        filtered_df = essential_services_df[essential_services_df['Occupation'].str.contains('fire', case=False, na=False)]
-    elif service_type == "nurse":
-        filtered_df = essential_services_df[essential_services_df['Occupation'].str.contains('nurse', case=False, na=False)]
-    
-    provinces_list = list(provinces.keys())
-    province_data = []
-    
-    for occ in filtered_df['Occupation'].unique():
-        total = filtered_df[filtered_df['Occupation'] == occ]['Total'].iloc[0]
-        for province in provinces_list:
-            pop_proportion = provinces[province]['Population'] / sum([p['Population'] for p in provinces.values()])
-            variation = np.random.uniform(0.7, 1.3)
-            province_value = int(total * pop_proportion * variation)
-            
-            province_data.append({
-                'Province': province,
-                'Occupation': occ,
-                'Count': province_value,
-                'Per10K': (province_value / provinces[province]['Population']) * 10000
-            })
-    
-    province_df = pd.DataFrame(province_data)
-    
-    if service_type == "all":
-        province_df = province_df.groupby('Province').agg({
-            'Count': 'sum',
-            'Per10K': 'sum'
-        }).reset_index()
-    
-    y_column = 'Per10K' if normalization == 'normalized' else 'Count'
-    y_title = 'Personnel per 10,000 Population' if normalization == 'normalized' else 'Number of Personnel'
-    
-    if sort_by == 'province':
-        province_df = province_df.sort_values('Province')
-    elif sort_by == 'count_desc':
-        province_df = province_df.sort_values(y_column, ascending=False)
-    else:
-        province_df = province_df.sort_values(y_column, ascending=True)
-    
-    fig = px.bar(
-        province_df,
-        x='Province',
-        y=y_column,
-        color='Province',
-        title=f'Essential Services Distribution ({service_type.title()})',
-        labels={'Province': 'Province/Territory', y_column: y_title}
-    )
+
+@app.callback(
+    Output("gender-employment-data", "data"),
+    Input("noc-dropdown", "value")
+)
+@metrics.instrument("gender-employment-data")
+@figures.memoize("gender-employment-data")
+@figure_builder.measured("gender-employment-data")
+def update_gender_employment_data(selected_nocs):
+    data = datasets.current
+    if not selected_nocs:
+        selected_nocs = data.noc_top_level_df['Occupation'].unique()[:3].tolist()
     
-    fig.update_layout(
-        xaxis_tickangle=-45,
-        legend_title="Province/Territory",
-        height=600
-    )
+    with metrics.stage('filter'):
+        # Typeahead can select any NOC row, not just the top-level groups.
+        filtered_df = data.df.iloc[occupation_search.rows_for(data.search_index, selected_nocs)]
+    metrics.observe_rows(len(filtered_df))
     
-    return fig
+    with metrics.stage('build'):
+        return {
+            'occupation': filtered_df['Occupation'].tolist(),
+            'men': figure_builder.typed_array(filtered_df['Men']),
+            'women': figure_builder.typed_array(filtered_df['Women'])
+        }
 
+# The dropdown starts with the top-level groups; typing replaces them with the
+# best matches over every NOC row. Current selections are always kept, or the
+# dropdown would drop them from view.
 @app.callback(
+    Output("noc-dropdown", "options"),
+    Input("noc-dropdown", "search_value"),
+    State("noc-dropdown", "value"),
+    # The layout already carries the default options.
+    prevent_initial_call=True
+)
+@metrics.instrument("noc-dropdown-options")
+def update_noc_options(search_value, selected_nocs):
+    data = datasets.current
+    selected_nocs = selected_nocs or []
+    with metrics.stage('filter'):
+        if search_value:
+            rows = occupation_search.search(data.search_index, search_value, NOC_SEARCH_LIMIT)
+            matches = [data.search_index['occupations'][row] for row in rows]
+        else:
+            matches = data.noc_top_level_df['Occupation'].unique().tolist()
+    metrics.observe_rows(len(matches))
+    return [{"label": occ, "value": occ} for occ in selected_nocs + [occ for occ in matches if occ not in selected_nocs]]
+
+app.clientside_callback(
+    ClientsideFunction(namespace="dashboard", function_name="renderGenderEmployment"),
     Output("gender-employment-graph", "figure"),
     [
-        Input("noc-dropdown", "value"),
+        Input("gender-employment-data", "data"),
         Input("chart-type-radio", "value")
     ]
 )
-def update_gender_employment_graph(selected_nocs, chart_type):
-    if not selected_nocs:
-        selected_nocs = noc_top_level_df['Occupation'].unique()[:3].tolist()
-    
-    filtered_df = noc_top_level_df[noc_top_level_df['Occupation'].isin(selected_nocs)]
+
+@metrics.instrument("noc-drilldown-graph")
+@figures.memoize("noc-drilldown-graph")
+@figure_builder.measured("noc-drilldown-graph")
+def noc_drilldown_figure(node):
+    data = datasets.current
+    drilldown = data.drilldown
+    with metrics.stage('filter'):
+        rows = drilldown['children'].get(node, np.array([], dtype=np.int64))
+        occupations = data.df['Occupation'].to_numpy()
+    metrics.observe_rows(len(rows))
     
-    if chart_type == "ratio":
-        filtered_df = filtered_df.copy()
-        filtered_df['Ratio'] = filtered_df['Men'] / filtered_df['Women']
-        
-        fig = px.bar(
-            filtered_df,
-            x='Occupation',
-            y='Ratio',
-            color='Occupation',
-            title='Gender Ratio (Men/Women) by NOC Category',
-            labels={'Occupation': 'NOC Category', 'Ratio': 'Men/Women Ratio'}
+    with metrics.stage('build'):
+        total = drilldown['total'][rows]
+        women_share = np.divide(drilldown['women'][rows], total, out=np.full(len(rows), 0.5), where=total > 0)
+        trace = dict(
+            type='treemap',
+            ids=[str(row) for row in rows.tolist()],
+            labels=occupations[rows].tolist(),
+            parents=[''] * len(rows),
+            values=figure_builder.typed_array(total),
+            customdata=np.column_stack([drilldown['men'][rows], drilldown['women'][rows], drilldown['fanout'][rows]]).tolist(),
+            hovertemplate='%{label}<br>Total: %{value:,}<br>Men: %{customdata[0]:,}<br>Women: %{customdata[1]:,}<br>Sub-groups: %{customdata[2]}<extra></extra>',
+            marker={
+                'colors': figure_builder.typed_array(women_share),
+                'cmin': 0,
+                'cmax': 1,
+                'colorscale': [[0, 'blue'], [0.5, 'white'], [1, 'red']],
+                'colorbar': {'title': {'text': 'Women share'}}
+            }
         )
-        
-        fig.add_shape(
-            type="line",
-            x0=-0.5,
-            y0=1,
-            x1=len(filtered_df) - 0.5,
-            y1=1,
-            line=dict(color="red", width=2, dash="dash"),
-        )
-        
-    else:
-        df_long = pd.melt(
-            filtered_df,
-            id_vars=['Occupation'],
-            value_vars=['Men', 'Women'],
-            var_name='Gender',
-            value_name='Count'
-        )
-        
-        barmode = 'group' if chart_type == "group" else 'stack'
-        
-        fig = px.bar(
-            df_long,
-            x='Occupation',
-            y='Count',
-            color='Gender',
-            barmode=barmode,
-            title='Employment by Gender and NOC Category',
-            labels={'Occupation': 'NOC Category', 'Count': 'Number of Employed Persons'}
-        )
-    
-    fig.update_layout(height=600)
-    return fig
+        return figure_builder.figure([trace], title={'text': noc_path(occupations, data.noc_index, node)})
+
+# Only the clicked node's children are ever sent; the current node lives in a
+# store so "up" can walk back through noc_index parents. After the first
+# render, navigation sends a Patch with just the tiles and the title.
+DRILLDOWN_PATCH_PATHS = ['ids', 'labels', 'parents', 'values', 'customdata', 'marker.colors']
 
 @app.callback(
-    Output("engineering-manpower-graph", "figure"),
     [
-        Input("engineering-checklist", "value"),
-        Input("engineering-view-radio", "value")
-    ]
+        Output("noc-drilldown-graph", "figure"),
+        Output("noc-drilldown-node", "data")
+    ],
+    [
+        Input("noc-drilldown-graph", "clickData"),
+        Input("noc-drilldown-up", "n_clicks")
+    ],
+    State("noc-drilldown-node", "data")
 )
-def update_engineering_manpower_graph(selected_types, view_type):
+# Labelled by the node the click or "up" started from.
+@metrics.instrument("noc-drilldown-graph.update", labels=lambda click_data, up_clicks, node: (node,))
+def update_noc_drilldown(click_data, up_clicks, node):
+    data = datasets.current
+    if node not in data.drilldown['children']:
+        # Unknown after a dataset reload.
+        node = ROOT_NODE
+    if dash.ctx.triggered_id == "noc-drilldown-up" and node != ROOT_NODE:
+        node = int(data.noc_index['parent'][node])
+    elif dash.ctx.triggered_id == "noc-drilldown-graph" and click_data:
+        clicked = int(click_data['points'][0]['id'])
+        if clicked not in data.drilldown['children']:
+            # A leaf occupation; nothing below it.
+            raise PreventUpdate
+        node = clicked
+    figure = noc_drilldown_figure(node)
+    if dash.ctx.triggered_id is None:
+        return figure, node
+    # The treemap on screen already has this trace and layout; swap its data.
+    patch = figure_builder.patch_from(figure, DRILLDOWN_PATCH_PATHS, ['title'])
+    return figure_builder.smaller("noc-drilldown-graph.update", figure, patch), node
+
+@app.callback(
+    Output("engineering-manpower-data", "data"),
+    Input("engineering-checklist", "value")
+)
+@metrics.instrument("engineering-manpower-data")
+@figures.memoize("engineering-manpower-data")
+@figure_builder.measured("engineering-manpower-data")
+def update_engineering_manpower_data(selected_types):
+    data = datasets.current
     if not selected_types:
         selected_types = ["computer", "mechanical", "electrical"]
     
-    engineering_filters = []
-    if "computer" in selected_types:
-        engineering_filters.append("computer")
-    if "mechanical" in selected_types:
-        engineering_filters.append("mechanical")
-    if "electrical" in selected_types:
-        engineering_filters.append("electrical")
-    
-    filtered_df = engineering_df[
-        engineering_df['Occupation'].str.contains('|'.join(engineering_filters), case=False, na=False)
-    ]
-    
-    provinces_list = list(provinces.keys())
-    province_data = []
+    with metrics.stage('filter'):
+        engineering_filters = [t for t in ENGINEERING_TYPES if t in selected_types]
+        rows = lookup_rows(data.noc_index, engineering_filters, within=data.engineering_rows)
+    metrics.observe_rows(len(rows))
     
-    for occ in filtered_df['Occupation'].unique():
-        total = filtered_df[filtered_df['Occupation'] == occ]['Total'].iloc[0]
-        for province in provinces_list:
-            pop_proportion = provinces[province]['Population'] / sum([p['Population'] for p in provinces.values()])
-            variation = np.random.uniform(0.8, 1.2)
-            province_value = int(total * pop_proportion * variation)
-            
-            engineer_type = "Computer" if "computer" in occ.lower() else "Mechanical" if "mechanical" in occ.lower() else "Electrical"
-            
-            province_data.append({
-                'Province': province,
-                'EngineerType': engineer_type,
-                'Count': province_value,
-                'Per10K': (province_value / provinces[province]['Population']) * 10000
-            })
-    
-    province_df = pd.DataFrame(province_data)
-    
-    y_column = 'Per10K' if view_type == 'per_capita' else 'Count'
-    y_title = 'Engineers per 10,000 Population' if view_type == 'per_capita' else 'Number of Engineers'
-    
-    fig = px.bar(
-        province_df,
-        x='Province',
-        y=y_column,
-        color='EngineerType',
-        barmode='group',
-        title='Engineering Workforce by Province',
-        labels={'Province': 'Province/Territory', y_column: y_title, 'EngineerType': 'Engineer Type'}
-    )
-    
-    fig.update_layout(
-        xaxis_tickangle=-45,
-        height=600
-    )
-    
-    return fig
+    with metrics.stage('allocate'):
+        lowered = data.df['Occupation'].iloc[rows].str.lower()
+        engineer_types = np.where(
+            lowered.str.contains('computer', regex=False), 'Computer',
+            np.where(lowered.str.contains('mechanical', regex=False), 'Mechanical', 'Electrical')
+        )
+        series_counts = [
+            (engineer_type, data.province_counts[rows[engineer_types == engineer_type]].sum(axis=0))
+            for engineer_type in pd.unique(engineer_types)
+        ]
+    with metrics.stage('build'):
+        series = [
+            {
+                'name': engineer_type,
+                'count': figure_builder.typed_array(counts),
+                'per10k': figure_builder.typed_array(counts / province_table['population'] * 10000)
+            }
+            for engineer_type, counts in series_counts
+        ]
+        return {'province': province_table['names'].tolist(), 'series': series}
 
-@app.callback(
-    Output("custom-insight-graph", "figure"),
+app.clientside_callback(
+    ClientsideFunction(namespace="dashboard", function_name="renderEngineeringManpower"),
+    Output("engineering-manpower-graph", "figure"),
     [
-        Input("occupation-category-dropdown", "value"),
-        Input("analysis-type-radio", "value")
+        Input("engineering-manpower-data", "data"),
+        Input("engineering-view-radio", "value")
     ]
 )
+
+@metrics.instrument("custom-insight-graph")
+@figures.memoize("custom-insight-graph")
+@figure_builder.measured("custom-insight-graph")
 def update_custom_insight_graph(category, analysis_type):
-    category_filters = {
-        "business": ["business", "finance", "administration"],
-        "science": ["natural", "applied sciences", "engineering"],
-        "health": ["health", "nurse", "medical"],
-        "education": ["education", "law", "social"],
-        "art": ["art", "culture", "recreation"]
-    }
-    
-    filtered_df = df[
-        df['Occupation'].str.contains('|'.join(category_filters[category]), case=False, na=False)
-    ]
+    data = datasets.current
+    aggregates = data.insight_aggregates[category]
+    metrics.observe_rows(len(aggregates['rows']))
+    background_jobs.report_progress(1, 2)
     
     if analysis_type == "hierarchy":
-        filtered_df = filtered_df.copy()
-        filtered_df['Level'] = filtered_df['Occupation'].apply(lambda x: (len(x) - len(x.lstrip(' ')))) // 2
-        
-        level_data = filtered_df.groupby('Level').agg({
-            'Men': 'sum',
-            'Women': 'sum'
-        }).reset_index()
+        level_data = aggregates['levels']
         
-        level_data['Total'] = level_data['Men'] + level_data['Women']
-        level_data['Men_Pct'] = (level_data['Men'] / level_data['Total']) * 100
-        level_data['Women_Pct'] = (level_data['Women'] / level_data['Total']) * 100
-        
-        fig = go.Figure()
-        fig.add_trace(go.Bar(x=level_data['Level'], y=level_data['Men_Pct'], name='Men', marker_color='blue'))
-        fig.add_trace(go.Bar(x=level_data['Level'], y=level_data['Women_Pct'], name='Women', marker_color='red'))
-        fig.add_shape(type="line", x0=-0.5, y0=50, x1=level_data['Level'].max()+0.5, y1=50, line=dict(color="green", width=2, dash="dash"))
-        fig.update_layout(
-            title=f'Gender Distribution by Hierarchy Level ({category.title()})',
-            xaxis_title='Hierarchy Level',
-            yaxis_title='Percentage (%)',
-            barmode='group',
-            height=600
-        )
+        with metrics.stage('build'):
+            fig = figure_builder.figure(
+                [
+                    figure_builder.bar(figure_builder.typed_array(level_data['Level']), figure_builder.typed_array(level_data['Men_Pct']), name='Men', marker={'color': 'blue'}),
+                    figure_builder.bar(figure_builder.typed_array(level_data['Level']), figure_builder.typed_array(level_data['Women_Pct']), name='Women', marker={'color': 'red'})
+                ],
+                title={'text': f'Gender Distribution by Hierarchy Level ({category.title()})'},
+                xaxis={'title': {'text': 'Hierarchy Level'}},
+                yaxis={'title': {'text': 'Percentage (%)'}},
+                barmode='group',
+                shapes=[dict(type="line", x0=level_data['Level'].min()-0.5, y0=50, x1=level_data['Level'].max()+0.5, y1=50, line=dict(color="green", width=2, dash="dash"))]
+            )
         
     else:
-        filtered_df = filtered_df.copy()
-        filtered_df['GPI'] = filtered_df.apply(lambda row: row['Women'] / row['Men'] if row['Men'] > 0 else float('inf'), axis=1)
-        sorted_df = filtered_df.sort_values('GPI')
-        
-        n_items = min(10, len(sorted_df) // 2)
-        bottom_n = sorted_df.head(n_items)
-        top_n = sorted_df.tail(n_items)
-        combined_df = pd.concat([bottom_n, top_n])
-        
-        fig = px.bar(
-            combined_df,
-            y='Occupation',
-            x='GPI',
-            orientation='h',
-            title=f'Gender Parity Index ({category.title()})',
-            labels={'Occupation': 'Occupation', 'GPI': 'Gender Parity Index (Women/Men)'},
-            color='GPI',
-            color_continuous_scale=['blue', 'white', 'red'],
-            range_color=[0, 2]
-        )
+        with metrics.stage('filter'):
+            picked = select_extremes(aggregates['rank'], min(10, len(aggregates['rank']) // 2))
+            combined_df = pd.DataFrame({
+                'Occupation': data.df['Occupation'].to_numpy()[aggregates['rows'][picked]],
+                'GPI': aggregates['gpi'][picked]
+            })
         
-        fig.add_shape(type="line", x0=1, y0=-0.5, x1=1, y1=len(combined_df)-0.5, line=dict(color="green", width=2, dash="dash"))
-        fig.update_layout(height=800)
+        with metrics.stage('build'):
+            gpi = figure_builder.typed_array(combined_df['GPI'])
+            fig = figure_builder.figure(
+                [figure_builder.bar(gpi, combined_df['Occupation'].tolist(), orientation='h', marker={
+                    'color': gpi,
+                    'cmin': 0,
+                    'cmax': 2,
+                    'colorscale': [[0, 'blue'], [0.5, 'white'], [1, 'red']],
+                    'colorbar': {'title': {'text': 'Gender Parity Index (Women/Men)'}}
+                })],
+                title={'text': f'Gender Parity Index ({category.title()})'},
+                xaxis={'title': {'text': 'Gender Parity Index (Women/Men)'}},
+                yaxis={'title': {'text': 'Occupation'}},
+                height=800,
+                shapes=[dict(type="line", x0=1, y0=-0.5, x1=1, y1=len(combined_df)-0.5, line=dict(color="green", width=2, dash="dash"))]
+            )
     
+    background_jobs.report_progress(2, 2)
     return fig
 
+# A category change keeps the chart type, so once a parity figure is on screen
+# the callback sends a Patch with the new trace data, title and reference line
+# instead of the whole figure, when that is smaller. The hierarchy figure is two
+# short traces whose Patch is always larger, so it is sent whole without
+# building one.
+# custom-insight-rendered records which analysis type the graph holds; it is
+# written in the same response as the figure, so a cancelled job cannot leave
+# them out of step.
+CUSTOM_INSIGHT_PATCH_PATHS = ['x', 'y', 'marker.color']
+PATCHED_ANALYSES = ['parity']
+
+@metrics.instrument("custom-insight-graph.update")
+def custom_insight_output(category, analysis_type, rendered_type):
+    figure = update_custom_insight_graph(category, analysis_type)
+    if rendered_type != analysis_type or analysis_type not in PATCHED_ANALYSES:
+        return figure, analysis_type
+    patch = figure_builder.patch_from(figure, CUSTOM_INSIGHT_PATCH_PATHS, ['title', 'shapes'])
+    return figure_builder.smaller("custom-insight-graph.update", figure, patch), analysis_type
+
+# The custom insight figure is the one heavy server-rendered chart, so it runs
+# as a background job when a manager is configured: identical in-flight inputs
+# share one job, changing the inputs cancels the previous one, and the bar
+# above the graph shows progress. The data-store callbacks behind the toggles
+# stay synchronous.
+custom_insight_outputs = [
+    Output("custom-insight-graph", "figure"),
+    Output("custom-insight-rendered", "data")
+]
+custom_insight_inputs = [
+    Input("occupation-category-dropdown", "value"),
+    Input("analysis-type-radio", "value")
+]
+custom_insight_state = State("custom-insight-rendered", "data")
+
+if background_manager is not None:
+    @app.callback(
+        custom_insight_outputs,
+        custom_insight_inputs,
+        custom_insight_state,
+        background=True,
+        interval=250,
+        running=[(Output("custom-insight-progress", "style"), {"visibility": "visible"}, {"visibility": "hidden"})],
+        progress=[Output("custom-insight-progress", "value"), Output("custom-insight-progress", "max")]
+    )
+    def update_custom_insight_graph_background(set_progress, category, analysis_type, rendered_type):
+        return background_jobs.with_progress(set_progress, custom_insight_output, category, analysis_type, rendered_type)
+else:
+    app.callback(custom_insight_outputs, custom_insight_inputs, custom_insight_state)(custom_insight_output)
+
 if __name__ == "__main__":
+    datasets.start_watching()
     app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,160 @@
+// Clientside renderers for the toggles that only re-shape data the browser
+// already holds. The server writes the numbers to a dcc.Store when the row
+// selection changes; everything here runs without a round-trip. COLORS and the
+// base layout mirror figure_builder.py.
+
+(function () {
+    var COLORS = ['#636efa', '#EF553B', '#00cc96', '#ab63fa', '#FFA15A',
+                  '#19d3f3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52'];
+
+    function layout(extra) {
+        var base = {
+            height: 600,
+            plot_bgcolor: '#E5ECF6',
+            paper_bgcolor: 'white',
+            colorway: COLORS,
+            font: {color: '#2a3f5f'},
+            xaxis: {gridcolor: 'white', automargin: true},
+            yaxis: {gridcolor: 'white', zerolinecolor: 'white', automargin: true}
+        };
+        Object.keys(extra).forEach(function (key) {
+            if (base[key] && typeof base[key] === 'object' && !Array.isArray(base[key])) {
+                base[key] = Object.assign({}, base[key], extra[key]);
+            } else {
+                base[key] = extra[key];
+            }
+        });
+        return base;
+    }
+
+    var TYPED_ARRAYS = {
+        f8: Float64Array, f4: Float32Array, i4: Int32Array, u4: Uint32Array,
+        i2: Int16Array, u2: Uint16Array, i1: Int8Array, u1: Uint8Array
+    };
+
+    // Store payloads carry numbers as {dtype, bdata} typed arrays.
+    function decode(value) {
+        if (!value || !value.bdata) {
+            return value;
+        }
+        var binary = atob(value.bdata);
+        var bytes = new Uint8Array(binary.length);
+        for (var i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        return Array.from(new TYPED_ARRAYS[value.dtype](bytes.buffer));
+    }
+
+    function range(n) {
+        var out = [];
+        for (var i = 0; i < n; i++) {
+            out.push(i);
+        }
+        return out;
+    }
+
+    function renderEssentialServices(data, normalization, sortBy) {
+        if (!data) {
+            return window.dash_clientside.no_update;
+        }
+        var normalized = normalization === 'normalized';
+        var values = decode(normalized ? data.per10k : data.count);
+        var order = range(data.province.length);
+        if (sortBy === 'province') {
+            order.sort(function (a, b) { return data.province[a].localeCompare(data.province[b]); });
+        } else if (sortBy === 'count_desc') {
+            order.sort(function (a, b) { return values[b] - values[a]; });
+        } else {
+            order.sort(function (a, b) { return values[a] - values[b]; });
+        }
+        return {
+            data: [{
+                type: 'bar',
+                x: order.map(function (i) { return data.province[i]; }),
+                y: order.map(function (i) { return values[i]; }),
+                marker: {color: order.map(function (i) { return COLORS[i % COLORS.length]; })}
+            }],
+            layout: layout({
+                title: {text: data.title},
+                showlegend: false,
+                xaxis: {title: {text: 'Province/Territory'}, tickangle: -45},
+                yaxis: {title: {text: normalized ? 'Personnel per 10,000 Population' : 'Number of Personnel'}}
+            })
+        };
+    }
+
+    function renderGenderEmployment(data, chartType) {
+        if (!data) {
+            return window.dash_clientside.no_update;
+        }
+        var men = decode(data.men);
+        var women = decode(data.women);
+        if (chartType === 'ratio') {
+            return {
+                data: [{
+                    type: 'bar',
+                    x: data.occupation,
+                    y: men.map(function (value, i) { return value / women[i]; }),
+                    marker: {color: data.occupation.map(function (_, i) { return COLORS[i % COLORS.length]; })}
+                }],
+                layout: layout({
+                    title: {text: 'Gender Ratio (Men/Women) by NOC Category'},
+                    showlegend: false,
+                    xaxis: {title: {text: 'NOC Category'}},
+                    yaxis: {title: {text: 'Men/Women Ratio'}},
+                    shapes: [{
+                        type: 'line', x0: -0.5, y0: 1, x1: data.occupation.length - 0.5, y1: 1,
+                        line: {color: 'red', width: 2, dash: 'dash'}
+                    }]
+                })
+            };
+        }
+        return {
+            data: [
+                {type: 'bar', name: 'Men', x: data.occupation, y: men, marker: {color: COLORS[0]}},
+                {type: 'bar', name: 'Women', x: data.occupation, y: women, marker: {color: COLORS[1]}}
+            ],
+            layout: layout({
+                title: {text: 'Employment by Gender and NOC Category'},
+                barmode: chartType === 'group' ? 'group' : 'stack',
+                legend: {title: {text: 'Gender'}},
+                xaxis: {title: {text: 'NOC Category'}},
+                yaxis: {title: {text: 'Number of Employed Persons'}}
+            })
+        };
+    }
+
+    function renderEngineeringManpower(data, viewType) {
+        if (!data) {
+            return window.dash_clientside.no_update;
+        }
+        var perCapita = viewType === 'per_capita';
+        var traces = data.series.map(function (series, i) {
+            return {
+                type: 'bar',
+                name: series.name,
+                x: data.province,
+                y: decode(perCapita ? series.per10k : series.count),
+                marker: {color: COLORS[i % COLORS.length]}
+            };
+        });
+        return {
+            data: traces,
+            layout: layout({
+                title: {text: 'Engineering Workforce by Province'},
+                barmode: 'group',
+                legend: {title: {text: 'Engineer Type'}},
+                xaxis: {title: {text: 'Province/Territory'}, tickangle: -45},
+                yaxis: {title: {text: perCapita ? 'Engineers per 10,000 Population' : 'Number of Engineers'}}
+            })
+        };
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        dashboard: {
+            renderEssentialServices: renderEssentialServices,
+            renderGenderEmployment: renderGenderEmployment,
+            renderEngineeringManpower: renderEngineeringManpower
+        }
+    });
+})();
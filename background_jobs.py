@@ -0,0 +1,144 @@
+import os
+import signal
+import threading
+
+import metrics
+
+try:
+    import diskcache
+    import multiprocess
+    import psutil
+    from dash import DiskcacheManager
+except ImportError:
+    diskcache = multiprocess = psutil = None
+    DiskcacheManager = object
+
+# Heavy callbacks run as Dash background callbacks on a local diskcache queue:
+# each job is a process forked from the gunicorn worker, results and progress go
+# through a SQLite cache on local disk, and there is no broker to run.
+#
+# On top of Dash's DiskcacheManager:
+#   - a result already in the cache (same inputs, same dataset version) is
+#     served without forking a job at all;
+#   - identical inputs already being computed attach to the running job instead
+#     of forking another one;
+#   - a shared job is only killed when the last request waiting on it cancels
+#     (Dash cancels the previous job when the user changes the inputs);
+#   - finished jobs are reaped by the worker that forked them, on SIGCHLD,
+#     since the request that collects the result may land on another worker.
+#
+# Without the optional "dash[diskcache]" extra, or with BACKGROUND_CALLBACKS=0,
+# make_manager returns None and the app registers plain synchronous callbacks.
+
+JOB_TTL = 600
+NO_JOB = 0
+
+class CoalescingDiskcacheManager(DiskcacheManager):
+    def call_job_fn(self, key, job_fn, args, context):
+        if self.result_ready(key):
+            return NO_JOB
+        inflight_key = 'inflight-' + key
+        with self.handle.transact():
+            entry = self.handle.get(inflight_key)
+            if entry is not None and self.job_running(entry['pid']):
+                entry['waiters'] += 1
+                self.handle.set(inflight_key, entry, expire=JOB_TTL)
+                return entry['pid']
+        # Fork outside the transaction; two first requests racing here just
+        # compute the same result twice.
+        reap_on_exit()
+        pid = super().call_job_fn(key, job_process(job_fn), args, context)
+        with self.handle.transact():
+            self.handle.set(inflight_key, {'pid': pid, 'waiters': 1}, expire=JOB_TTL)
+            self.handle.set('job-%d' % pid, inflight_key, expire=JOB_TTL)
+        return pid
+
+    def job_running(self, job):
+        # Jobs are reaped as soon as they exit, so one can vanish between
+        # Dash's pid_exists check and its Process lookup.
+        try:
+            return super().job_running(job)
+        except psutil.NoSuchProcess:
+            return False
+
+    def terminate_job(self, job):
+        if job is None or int(job) == NO_JOB:
+            return
+        pid = int(job)
+        with self.handle.transact():
+            # job-<pid> is left to expire: Dash can terminate the same job
+            # twice for one request and the second call still needs the key.
+            inflight_key = self.handle.get('job-%d' % pid)
+            entry = self.handle.get(inflight_key) if inflight_key else None
+            if entry is not None and entry['pid'] == pid and entry['waiters'] > 1:
+                entry['waiters'] -= 1
+                self.handle.set(inflight_key, entry, expire=JOB_TTL)
+                return
+            if entry is not None and entry['pid'] == pid:
+                self.handle.delete(inflight_key)
+        if (inflight_key and self.result_ready(inflight_key[len('inflight-'):])) or not self.job_running(pid):
+            # Dash terminates a job once its result has been read. By then it
+            # only has its metrics to flush and exits by itself, reaped by the
+            # worker that forked it (reap_on_exit); Dash's kill-and-wait would
+            # drop those metrics and block for up to a second.
+            reap_jobs()
+            return
+        # Cancelled before it finished: kill it without waiting, its parent
+        # reaps it. Jobs fork nothing, so there are no children to kill.
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+def reap_jobs(*_):
+    # Joins the finished jobs this process forked, through multiprocess so its
+    # own child bookkeeping is cleared as well; other workers' pids are ignored.
+    multiprocess.active_children()
+
+reaping = {'pid': None}
+
+def reap_on_exit():
+    # gunicorn resets SIGCHLD in each worker, so install the handler in the
+    # process that is about to fork. Handlers can only be set from the main
+    # thread; elsewhere (the threaded dev server) jobs are reaped whenever
+    # this process terminates or starts a job.
+    if reaping['pid'] == os.getpid() or threading.current_thread() is not threading.main_thread():
+        return
+    signal.signal(signal.SIGCHLD, reap_jobs)
+    reaping['pid'] = os.getpid()
+
+def job_process(job_fn):
+    def run(*args):
+        # The forked job starts with a copy of the worker's metrics registry.
+        metrics.start_job()
+        try:
+            job_fn(*args)
+        finally:
+            metrics.flush_job()
+    return run
+
+def make_manager(version):
+    if diskcache is None or os.environ.get('BACKGROUND_CALLBACKS', '1') == '0':
+        return None
+    cache = diskcache.Cache(os.environ.get('BACKGROUND_CACHE_DIR', '.background-cache'))
+    return CoalescingDiskcacheManager(
+        cache,
+        cache_by=[version],
+        expire=int(os.environ.get('BACKGROUND_RESULT_TTL', '3600'))
+    )
+
+# Lets code shared by the sync and background paths report progress without
+# knowing which one it runs under.
+current = threading.local()
+
+def report_progress(step, total):
+    set_progress = getattr(current, 'set_progress', None)
+    if set_progress is not None:
+        set_progress((step, total))
+
+def with_progress(set_progress, func, *args):
+    current.set_progress = set_progress
+    try:
+        return func(*args)
+    finally:
+        current.set_progress = None
@@ -0,0 +1,320 @@
+import argparse
+import gzip
+import inspect
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Latency benchmark for the dashboard's server callbacks.
+#
+#   python bench.py                         in-process, every input combination
+#   python bench.py --scales 1,10,100,1000  same, on synthetic data.csv copies
+#   python bench.py --http http://127.0.0.1:8000 --concurrency 16
+#                                           replay /_dash-update-component POSTs
+#   python bench.py --save base.json        keep results for a later --baseline
+#   python bench.py --baseline base.json    regression check (exit 1 on a slowdown)
+#
+# The view-mode, sort and chart-type toggles render clientside, so the server
+# callbacks below are the complete server-side input space; the drill-down
+# nodes and typeahead strings are a fixed sample of theirs.
+
+SEARCH_STRINGS = [None, 'nurse', 'eng', 'police off', '2131', 'manager', 'zzqx']
+
+# name -> (outputs, inputs, state) as (component id, property) pairs. A case's
+# args are the input values followed by the state values; state not given is
+# sent as None, so custom insight measures the full-figure path, while the
+# drill-down cases start from a node and measure the Patch sent on navigation.
+def callback_specs(app):
+    return {
+        'update_essential_services_data': ([('essential-services-data', 'data')], [('service-type-dropdown', 'value')], []),
+        'update_gender_employment_data': ([('gender-employment-data', 'data')], [('noc-dropdown', 'value')], []),
+        'update_engineering_manpower_data': ([('engineering-manpower-data', 'data')], [('engineering-checklist', 'value')], []),
+        'update_custom_insight_graph': (
+            [('custom-insight-graph', 'figure'), ('custom-insight-rendered', 'data')],
+            [('occupation-category-dropdown', 'value'), ('analysis-type-radio', 'value')],
+            [('custom-insight-rendered', 'data')]
+        ),
+        'update_noc_options': ([('noc-dropdown', 'options')], [('noc-dropdown', 'search_value')], [('noc-dropdown', 'value')]),
+        'update_noc_drilldown': (
+            [('noc-drilldown-graph', 'figure'), ('noc-drilldown-node', 'data')],
+            [('noc-drilldown-graph', 'clickData'), ('noc-drilldown-up', 'n_clicks')],
+            [('noc-drilldown-node', 'data')]
+        ),
+        'render_active_tab': (
+            [('%s-tab' % tab_id, 'children') for tab_id, _, _ in app.TABS] + [('rendered-tabs', 'data')],
+            [('dashboard-tabs', 'active_tab')],
+            [('rendered-tabs', 'data')]
+        )
+    }
+
+def subsets(values, max_size):
+    for size in range(1, max_size + 1):
+        for combination in itertools.combinations(values, size):
+            yield list(combination)
+
+def callback_cases(app, noc_max, noc_pool=10, node_pool=60):
+    # Synthetic copies multiply the top-level categories and drill-down nodes
+    # too; enumerate the first noc_pool / node_pool only so the case count
+    # stays constant across scales.
+    data = app.datasets.current
+    nocs = data.noc_top_level_df['Occupation'].unique().tolist()[:noc_pool]
+    inputs = {
+        'update_essential_services_data': [(s,) for s in ['all', 'police', 'fire', 'nurse']],
+        'update_gender_employment_data': [(s,) for s in subsets(nocs, noc_max)],
+        'update_engineering_manpower_data': [(s,) for s in subsets(app.ENGINEERING_TYPES, len(app.ENGINEERING_TYPES))],
+        'update_custom_insight_graph': list(itertools.product(app.CATEGORY_FILTERS, ['hierarchy', 'parity'])),
+        'update_noc_options': [(text, []) for text in SEARCH_STRINGS],
+        'update_noc_drilldown': [(None, None, node) for node in list(data.drilldown['children'])[:node_pool]],
+        'render_active_tab': [(tab_id, [app.FIRST_TAB]) for tab_id, _, _ in app.TABS if tab_id != app.FIRST_TAB]
+    }
+    return [(name, args) for name in callback_specs(app) for args in inputs[name]]
+
+# In-process calls get the callback context Dash would set for the request, so
+# callbacks that read dash.ctx (the drill-down) run their navigation path.
+def in_callback_context(changed, func, args):
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+    token = context_value.set(AttributeDict(triggered_inputs=[{'prop_id': changed, 'value': None}]))
+    try:
+        return func(*args)
+    finally:
+        context_value.reset(token)
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+def run_in_process(noc_max, repeat, cached):
+    from plotly.io.json import to_json_plotly
+    started = time.perf_counter()
+    import app
+    import_seconds = time.perf_counter() - started
+
+    specs = callback_specs(app)
+    cases = callback_cases(app, noc_max)
+    results = {}
+    for name, args in cases:
+        func = getattr(app, name)
+        if not cached:
+            func = inspect.unwrap(func)
+        changed = '%s.%s' % specs[name][1][0]
+        stats = results.setdefault(name, {'latency_ms': [], 'alloc_kb': [], 'bytes': []})
+        for _ in range(repeat):
+            started = time.perf_counter()
+            payload = to_json_plotly(in_callback_context(changed, func, args))
+            stats['latency_ms'].append((time.perf_counter() - started) * 1000)
+        stats['bytes'].append(len(payload))
+        # Allocation pass is separate so tracing overhead stays out of the timings.
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        to_json_plotly(in_callback_context(changed, func, args))
+        stats['alloc_kb'].append(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+
+    return {
+        'rows': len(app.datasets.current.df),
+        'import_seconds': import_seconds,
+        'callbacks': {
+            name: dict(
+                percentiles(stats['latency_ms']),
+                calls=len(stats['latency_ms']),
+                peak_alloc_kb=float(np.mean(stats['alloc_kb'])),
+                mean_bytes=float(np.mean(stats['bytes']))
+            )
+            for name, stats in results.items()
+        }
+    }
+
+def dash_request(spec, args):
+    outputs, inputs, state = spec
+    values = list(args) + [None] * (len(inputs) + len(state) - len(args))
+    request = {
+        'inputs': [{'id': input_id, 'property': prop, 'value': value} for (input_id, prop), value in zip(inputs, values)],
+        'state': [{'id': state_id, 'property': prop, 'value': value} for (state_id, prop), value in zip(state, values[len(inputs):])],
+        'changedPropIds': ['%s.%s' % inputs[0]]
+    }
+    if len(outputs) == 1:
+        request['output'] = '%s.%s' % outputs[0]
+        request['outputs'] = {'id': outputs[0][0], 'property': outputs[0][1]}
+    else:
+        request['output'] = '..%s..' % '...'.join('%s.%s' % output for output in outputs)
+        request['outputs'] = [{'id': output_id, 'property': prop} for output_id, prop in outputs]
+    return request
+
+# Background callbacks answer the first POST with a job handle; the renderer
+# then re-posts with ?cacheKey=...&job=... until the response is ready.
+def fetch(request, interval=0.05):
+    with urllib.request.urlopen(request) as response:
+        body = response.read()
+        ok = response.status == 200
+    size = len(body)
+    if response.headers.get('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    reply = json.loads(body) if ok and body else {}
+    if 'cacheKey' not in reply:
+        return size, ok
+    query = urllib.parse.urlencode({'cacheKey': reply['cacheKey'], 'job': reply['job']})
+    poll = urllib.request.Request(request.full_url + '?' + query, data=request.data, headers=dict(request.header_items()))
+    while True:
+        with urllib.request.urlopen(poll) as response:
+            body = response.read()
+            if response.status == 204 or not body:
+                # 204 means the job was cancelled or produced no update.
+                return size + len(body), response.status in (200, 204)
+        size += len(body)
+        if response.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        if 'response' in json.loads(body):
+            return size, True
+        time.sleep(interval)
+
+def run_http(url, concurrency, total, noc_max):
+    import app
+    specs = callback_specs(app)
+    bodies = [(name, json.dumps(dash_request(specs[name], args)).encode()) for name, args in callback_cases(app, noc_max)]
+    endpoint = url.rstrip('/') + '/_dash-update-component'
+    results = {}
+    lock = threading.Lock()
+
+    def post(item):
+        name, body = item
+        request = urllib.request.Request(endpoint, data=body, headers={
+            'Content-Type': 'application/json',
+            'Accept-Encoding': 'gzip'
+        })
+        started = time.perf_counter()
+        try:
+            size, ok = fetch(request)
+        except OSError:
+            size, ok = 0, False
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            stats = results.setdefault(name, {'latency_ms': [], 'bytes': [], 'errors': 0})
+            stats['latency_ms'].append(elapsed)
+            stats['bytes'].append(size)
+            stats['errors'] += not ok
+
+    requests = list(itertools.islice(itertools.cycle(bodies), total))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(post, requests))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': total,
+        'concurrency': concurrency,
+        'requests_per_second': total / elapsed,
+        'callbacks': {
+            name: dict(
+                percentiles(stats['latency_ms']),
+                calls=len(stats['latency_ms']),
+                errors=stats['errors'],
+                mean_bytes=float(np.mean(stats['bytes']))
+            )
+            for name, stats in results.items()
+        }
+    }
+
+def write_synthetic(source, target, scale):
+    raw = pd.read_csv(source, dtype=str)
+    copies = []
+    for replica in range(scale):
+        copy = raw.copy()
+        if replica:
+            copy['Occupation'] = copy['Occupation'] + ' [%d]' % replica
+        copies.append(copy)
+    pd.concat(copies, ignore_index=True).to_csv(target, index=False)
+
+def run_scales(scales, args):
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in scales:
+            path = os.path.join(tmp, 'data_x%d.csv' % scale)
+            write_synthetic('data.csv', path, scale)
+            env = dict(os.environ, DATA_PATH=path)
+            command = [sys.executable, __file__, '--json', '--repeat', str(args.repeat), '--noc-max', str(args.noc_max)]
+            if args.cached:
+                command.append('--cached')
+            output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+            report['x%d' % scale] = json.loads(output)
+    return report
+
+def print_report(report, title=''):
+    if 'callbacks' not in report:
+        for key, value in report.items():
+            print_report(value, key)
+        return
+    header = ' '.join('%s=%s' % (k, round(v, 3) if isinstance(v, float) else v) for k, v in report.items() if k != 'callbacks')
+    print('== %s %s' % (title, header))
+    print('%-34s %6s %9s %9s %9s %11s %10s' % ('callback', 'calls', 'p50 ms', 'p95 ms', 'p99 ms', 'alloc KB', 'bytes'))
+    for name, stats in report['callbacks'].items():
+        print('%-34s %6d %9.2f %9.2f %9.2f %11s %10.0f' % (
+            name, stats['calls'], stats['p50'], stats['p95'], stats['p99'],
+            '%.1f' % stats['peak_alloc_kb'] if 'peak_alloc_kb' in stats else '-', stats['mean_bytes']
+        ))
+
+def regressions(report, baseline, tolerance, path=''):
+    found = []
+    if 'callbacks' not in report:
+        for key, value in report.items():
+            if isinstance(value, dict) and key in baseline:
+                found += regressions(value, baseline[key], tolerance, path + key + ' ')
+        return found
+    for name, stats in report['callbacks'].items():
+        before = baseline.get('callbacks', {}).get(name)
+        if before and before['p95'] and stats['p95'] > before['p95'] * tolerance:
+            found.append('%s%s p95 %.2fms -> %.2fms' % (path, name, before['p95'], stats['p95']))
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard callbacks.')
+    parser.add_argument('--repeat', type=int, default=5, help='timed calls per input combination')
+    parser.add_argument('--noc-max', type=int, default=3, help='largest noc-dropdown selection to enumerate')
+    parser.add_argument('--cached', action='store_true', help='go through the figure cache instead of around it')
+    parser.add_argument('--scales', help='comma-separated synthetic dataset multipliers, e.g. 1,10,100,1000')
+    parser.add_argument('--http', metavar='URL', help='replay callback POSTs against a running server')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--json', action='store_true', help='print the raw report as JSON')
+    parser.add_argument('--save', metavar='PATH', help='write the report to PATH')
+    parser.add_argument('--baseline', metavar='PATH', help='compare p95 against a saved report')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='allowed p95 ratio against the baseline')
+    args = parser.parse_args()
+
+    if args.http:
+        report = run_http(args.http, args.concurrency, args.requests, args.noc_max)
+    elif args.scales:
+        report = run_scales([int(s) for s in args.scales.split(',')], args)
+    else:
+        report = run_in_process(args.noc_max, args.repeat, args.cached)
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print_report(report)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        for line in found:
+            print('REGRESSION', line)
+        if found:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
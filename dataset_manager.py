@@ -0,0 +1,108 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Holds the current immutable dataset snapshot and replaces it without a worker
+# restart. build(path) produces a complete snapshot off the request path; the
+# swap is a single attribute assignment, so a callback that reads
+# manager.current once sees one consistent version for its whole run.
+#
+# Every worker polls the data file (and a "<path>.reload" trigger file) every
+# `interval` seconds. request_reload() touches the trigger, so a reload asked of
+# one worker through the admin route reaches the rest of the pool as well.
+#
+# The watcher is started explicitly where requests are served: gunicorn.conf.py
+# starts it in each worker's post_fork, `python app.py` before app.run. The
+# preloading master, background-job processes and prerender's pool never poll,
+# and a forked child gets a fresh build_lock in case the fork happened mid-build.
+
+class DatasetManager:
+    def __init__(self, path, build, fallback, interval=10.0):
+        self.path = path
+        self.build = build
+        self.interval = interval
+        self.trigger_path = path + '.reload'
+        self.build_lock = threading.Lock()
+        self.last_error = None
+        self.loaded_at = None
+        self.reloads = 0
+        self.signature = self.file_signature()
+        try:
+            self.current = build(path)
+            self.loaded_at = time.time()
+        except Exception as e:
+            logger.exception('could not load %s, serving an empty dataset', path)
+            self.last_error = repr(e)
+            self.current = fallback()
+        self.watcher = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.after_fork)
+
+    def file_signature(self):
+        signature = []
+        for path in [self.path, self.trigger_path]:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def reload(self, reason='manual', force=True):
+        with self.build_lock:
+            signature = self.file_signature()
+            if not force and signature == self.signature:
+                # Another thread already rebuilt for this change.
+                return False
+            started = time.perf_counter()
+            try:
+                dataset = self.build(self.path)
+            except Exception as e:
+                logger.exception('reload of %s failed, keeping version %s', self.path, self.current.version)
+                self.last_error = repr(e)
+                # Wait for the next change instead of retrying every poll.
+                self.signature = signature
+                return False
+            self.signature = signature
+            previous, self.current = self.current.version, dataset
+            self.loaded_at = time.time()
+            self.last_error = None
+            self.reloads += 1
+            logger.info('dataset %s -> %s (%s, %.2fs)', previous, dataset.version, reason, time.perf_counter() - started)
+            return True
+
+    def request_reload(self):
+        with open(self.trigger_path, 'a'):
+            os.utime(self.trigger_path, None)
+        threading.Thread(target=self.reload, args=('admin',), name='dataset-reload', daemon=True).start()
+
+    def poll(self):
+        while True:
+            time.sleep(self.interval)
+            if self.file_signature() != self.signature:
+                self.reload('file change', force=False)
+
+    def start_watching(self):
+        if self.interval > 0 and (self.watcher is None or not self.watcher.is_alive()):
+            self.watcher = threading.Thread(target=self.poll, name='dataset-watcher', daemon=True)
+            self.watcher.start()
+
+    def after_fork(self):
+        # Threads do not survive fork, and a lock one of them held would stay
+        # held forever in the child.
+        self.build_lock = threading.Lock()
+        self.watcher = None
+
+    def status(self):
+        return {
+            'version': self.current.version,
+            'rows': len(self.current.df),
+            'path': self.path,
+            'loaded_at': self.loaded_at,
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+            'watch_interval': self.interval
+        }
@@ -0,0 +1,109 @@
+import csv
+import fcntl
+import io
+import os
+
+import numpy as np
+from flask import Response, jsonify
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Streaming writers for the /export routes. A table is a column spec plus a
+# generator of batches (dicts of equal-length arrays, at most BATCH_ROWS rows);
+# each batch is encoded and handed to the client before the next one is built,
+# so memory per export is one batch no matter how large the table is.
+#
+# An export holds a gunicorn worker for as long as the client reads (workers
+# are sync: background jobs fork from them, which is unsafe with threads), so
+# at most EXPORT_CONCURRENCY exports run at once across the whole pool and the
+# rest are answered 429, leaving the other workers for interactive callbacks.
+# The slots are flock()ed files in EXPORT_SLOT_DIR; the kernel drops a lock when
+# its worker dies, so a crashed export never leaks its slot.
+#
+# Parquet needs pyarrow (in requirements.txt); without it .parquet answers 501.
+
+BATCH_ROWS = 5000
+FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+EXPORT_CONCURRENCY = int(os.environ.get('EXPORT_CONCURRENCY', '2'))
+EXPORT_SLOT_DIR = os.environ.get('EXPORT_SLOT_DIR', '.export-slots')
+
+def acquire_slot():
+    os.makedirs(EXPORT_SLOT_DIR, exist_ok=True)
+    for slot in range(EXPORT_CONCURRENCY):
+        fd = os.open(os.path.join(EXPORT_SLOT_DIR, 'slot-%d.lock' % slot), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+    return None
+
+def batched(count, size=BATCH_ROWS):
+    for start in range(0, count, size):
+        yield start, min(start + size, count)
+
+def csv_chunks(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow([name for name, _ in columns])
+    for batch in batches:
+        values = [np.asarray(batch[name]).tolist() for name, _ in columns]
+        writer.writerows(zip(*values))
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+# Write-only file that hands out what was written since the last drain while
+# still reporting the absolute position the Parquet footer offsets rely on.
+class DrainingSink(io.RawIOBase):
+    def __init__(self):
+        self.pending = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.pending.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data, self.pending = b''.join(self.pending), []
+        return data
+
+def parquet_chunks(columns, batches):
+    schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in columns])
+    sink = DrainingSink()
+    # One row group per batch; its bytes are sent as soon as it is written.
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(pa.RecordBatch.from_pydict({name: batch[name] for name, _ in columns}, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+def stream(name, fmt, columns, batches):
+    if fmt == 'parquet' and pa is None:
+        return jsonify(error='parquet export needs pyarrow installed'), 501
+    slot = acquire_slot()
+    if slot is None:
+        return jsonify(error='too many exports in progress, retry shortly'), 429
+    chunks = csv_chunks(columns, batches) if fmt == 'csv' else parquet_chunks(columns, batches)
+    response = Response(chunks, mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = 'attachment; filename="%s.%s"' % (name, fmt)
+    # Released when the response is closed, even if the client never read it.
+    response.call_on_close(lambda: os.close(slot))
+    return response
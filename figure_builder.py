@@ -0,0 +1,127 @@
+import base64
+import functools
+import gzip
+import threading
+
+import numpy as np
+from dash import Patch
+from plotly.io.json import to_json_plotly
+
+import metrics
+
+# Minimal figure dicts instead of plotly express output: no embedded template,
+# one trace per chart where a per-bar colour array will do, and numeric arrays
+# shipped as base64 typed arrays ({"dtype", "bdata"}) that plotly.js decodes
+# natively. assets/dashboard.js mirrors TEMPLATE and COLORS for the clientside
+# renderers and decodes the same typed arrays out of the dcc.Store payloads.
+
+COLORS = ['#636efa', '#EF553B', '#00cc96', '#ab63fa', '#FFA15A',
+          '#19d3f3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52']
+
+TEMPLATE = {
+    'height': 600,
+    'plot_bgcolor': '#E5ECF6',
+    'paper_bgcolor': 'white',
+    'colorway': COLORS,
+    'font': {'color': '#2a3f5f'},
+    'xaxis': {'gridcolor': 'white', 'automargin': True},
+    'yaxis': {'gridcolor': 'white', 'zerolinecolor': 'white', 'automargin': True}
+}
+
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+def typed_array(values):
+    array = np.asarray(values)
+    if array.dtype.kind in 'iub':
+        if array.size == 0 or (array.min() >= INT32_MIN and array.max() <= INT32_MAX):
+            array = array.astype(np.int32)
+        else:
+            array = array.astype(np.float64)
+    elif array.dtype != np.float32:
+        array = array.astype(np.float64)
+    array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<'))
+    return {'dtype': array.dtype.str[1:], 'bdata': base64.b64encode(array.tobytes()).decode('ascii')}
+
+def layout(**extra):
+    merged = dict(TEMPLATE)
+    for key, value in extra.items():
+        if isinstance(merged.get(key), dict) and isinstance(value, dict):
+            merged[key] = dict(merged[key], **value)
+        else:
+            merged[key] = value
+    return merged
+
+def bar(x, y, **trace):
+    return dict(type='bar', x=x, y=y, **trace)
+
+def figure(traces, **layout_options):
+    return {'data': traces, 'layout': layout(**layout_options)}
+
+# Partial update that turns the figure on screen into `new`, for when both were
+# built by the same code path (same traces, same layout keys). Only the listed
+# per-trace data paths ("x", "marker.color", ...) and layout keys are sent;
+# the template, trace styling and hover templates stay as they are.
+def patch_from(new, trace_paths, layout_keys):
+    patch = Patch()
+    for i, trace in enumerate(new['data']):
+        for path in trace_paths:
+            keys = path.split('.')
+            value = trace
+            for key in keys:
+                value = value.get(key) if isinstance(value, dict) else None
+            if value is None:
+                continue
+            target = patch['data'][i]
+            for key in keys[:-1]:
+                target = target[key]
+            target[keys[-1]] = value
+    for key in layout_keys:
+        if key in new['layout']:
+            patch['layout'][key] = new['layout'][key]
+    return patch
+
+# Serialized size of the last payload each callback produced, as sent by Dash
+# before and after gzip.
+sizes = {}
+sizes_lock = threading.Lock()
+
+def record_size(callback_id, payload):
+    with metrics.stage('serialize'):
+        raw = to_json_plotly(payload).encode()
+    store_size(callback_id, raw)
+
+def store_size(callback_id, raw):
+    metrics.observe_bytes(len(raw))
+    with sizes_lock:
+        # Only the bytes are kept here; gzip runs when the report is read.
+        sizes[callback_id] = raw
+
+# Sends whichever of a full figure and its Patch serializes smaller; a Patch
+# carries a per-operation envelope that can outweigh a small figure.
+def smaller(callback_id, figure, patch):
+    with metrics.stage('serialize'):
+        full = to_json_plotly(figure).encode()
+        partial = to_json_plotly(patch).encode()
+    if len(partial) < len(full):
+        store_size(callback_id, partial)
+        return patch
+    store_size(callback_id, full)
+    return figure
+
+def size_report():
+    with sizes_lock:
+        latest = dict(sizes)
+    return {
+        callback_id: {'json_bytes': len(raw), 'gzip_bytes': len(gzip.compress(raw))}
+        for callback_id, raw in latest.items()
+    }
+
+def measured(callback_id):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            payload = func(*args)
+            record_size(callback_id, payload)
+            return payload
+        return wrapper
+    return decorator
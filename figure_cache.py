@@ -0,0 +1,197 @@
+import functools
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Memoizes figure-producing callbacks on (callback id, normalized inputs,
+# dataset version). The in-process LRU is always used; an optional SQLite file
+# lets every gunicorn worker on the host share hits. Payloads rendered ahead of
+# time by prerender.py are looked up first and never expire or get evicted.
+# The shared file is best effort: any SQLite error there counts as a miss.
+
+def normalize_inputs(args):
+    normalized = []
+    for value in args:
+        if isinstance(value, (list, tuple, set)):
+            # Multi-select values (noc-dropdown, engineering-checklist) are sets
+            # as far as the figures are concerned, so order must not split keys.
+            normalized.append(tuple(sorted(str(v) for v in value)))
+        else:
+            normalized.append(value)
+    return tuple(normalized)
+
+def make_key(callback_id, args, version):
+    raw = repr((callback_id, normalize_inputs(args), version)).encode()
+    return hashlib.sha1(raw).hexdigest()
+
+ACCESS_RESOLUTION = 60
+# A busy shared file is treated as a miss, so don't stall a callback on it.
+BUSY_TIMEOUT = 0.5
+
+class SQLiteBackend:
+    def __init__(self, path, maxsize=4096):
+        self.path = path
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+
+    def connect(self):
+        # Connections must not cross a fork, so reconnect in each worker.
+        if self.conn is None or self.pid != os.getpid():
+            self.conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS figures '
+                '(key TEXT PRIMARY KEY, expires REAL, accessed REAL, value BLOB)'
+            )
+            self.pid = os.getpid()
+        return self.conn
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            try:
+                conn = self.connect()
+                row = conn.execute('SELECT expires, accessed, value FROM figures WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    return None
+                if row[0] < now:
+                    conn.execute('DELETE FROM figures WHERE key = ?', (key,))
+                    conn.commit()
+                    return None
+                # Recency only drives eviction, so a hot key takes the shared
+                # write lock at most once per ACCESS_RESOLUTION, not on every hit.
+                if now - row[1] >= ACCESS_RESOLUTION:
+                    conn.execute('UPDATE figures SET accessed = ? WHERE key = ?', (now, key))
+                    conn.commit()
+            except sqlite3.Error:
+                # A locked, full or unreadable shared file is just a miss.
+                self.rollback()
+                return None
+        return pickle.loads(row[2])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self.lock:
+            try:
+                conn = self.connect()
+                conn.execute(
+                    'INSERT OR REPLACE INTO figures VALUES (?, ?, ?, ?)',
+                    (key, now + ttl, now, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+                )
+                conn.execute('DELETE FROM figures WHERE expires < ?', (now,))
+                conn.execute(
+                    'DELETE FROM figures WHERE key NOT IN '
+                    '(SELECT key FROM figures ORDER BY accessed DESC LIMIT ?)',
+                    (self.maxsize,)
+                )
+                conn.commit()
+            except sqlite3.Error:
+                # The value is still in this worker's LRU; only sharing is lost.
+                self.rollback()
+
+    def rollback(self):
+        try:
+            if self.conn is not None and self.pid == os.getpid():
+                self.conn.rollback()
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        with self.lock:
+            conn = self.connect()
+            conn.execute('DELETE FROM figures')
+            conn.commit()
+
+class FigureCache:
+    def __init__(self, maxsize=256, ttl=3600, backend=None, version=None, prerendered=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self.version = version or (lambda: None)
+        self.prerendered = prerendered or dict
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'shared_hits': 0, 'prerendered_hits': 0}
+
+    def get(self, key):
+        value = self.prerendered().get(key)
+        if value is not None:
+            with self.lock:
+                self.counters['hits'] += 1
+                self.counters['prerendered_hits'] += 1
+            return value
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] >= now:
+                    self.entries.move_to_end(key)
+                    self.counters['hits'] += 1
+                    return entry[1]
+                del self.entries[key]
+                self.counters['evictions'] += 1
+        if self.backend is not None:
+            value = self.backend.get(key)
+            if value is not None:
+                self.store(key, value)
+                with self.lock:
+                    self.counters['hits'] += 1
+                    self.counters['shared_hits'] += 1
+                return value
+        with self.lock:
+            self.counters['misses'] += 1
+        return None
+
+    def store(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def set(self, key, value):
+        self.store(key, value)
+        if self.backend is not None:
+            self.backend.set(key, value, self.ttl)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, size=len(self.entries), maxsize=self.maxsize, ttl=self.ttl, prerendered=len(self.prerendered()))
+
+    def memoize(self, callback_id):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                key = make_key(callback_id, args, self.version())
+                value = self.get(key)
+                if value is None:
+                    value = func(*args)
+                    self.set(key, value)
+                return value
+            return wrapper
+        return decorator
+
+def from_env(version=None, prerendered=None):
+    path = os.environ.get('FIGURE_CACHE_PATH')
+    maxsize = int(os.environ.get('FIGURE_CACHE_SIZE', '256'))
+    backend = SQLiteBackend(path, maxsize=maxsize * 16) if path else None
+    return FigureCache(
+        maxsize=maxsize,
+        ttl=float(os.environ.get('FIGURE_CACHE_TTL', '3600')),
+        backend=backend,
+        version=version,
+        prerendered=prerendered
+    )
@@ -0,0 +1,60 @@
+import gc
+import multiprocessing
+import os
+
+# Production entry point: gunicorn -c gunicorn.conf.py app:server
+#
+# The app (data, NOC index, layout) is imported once in the master and workers
+# are forked from it. Count columns are memory-mapped from the snapshot file and
+# the Python objects built at import are moved out of the collector's reach with
+# gc.freeze(), so forked workers keep sharing those pages copy-on-write instead
+# of dirtying them on the first collection.
+#
+# Set METRICS_DIR so /metrics reports totals summed over all workers, and read
+# /_workers/memory for the RSS/PSS of every worker and the pool's PSS total.
+#
+# Keep GUNICORN_THREADS at 1: background callback jobs are forked from the
+# worker, and a fork taken while another thread is inside a SQLite transaction
+# leaves the job unable to write its result. Long /export downloads are capped
+# across the pool by exports.py instead.
+
+bind = '0.0.0.0:%s' % os.environ.get('PORT', '5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+preload_app = True
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+def format_memory(memory):
+    return 'rss=%sKB pss=%sKB' % (memory.get('rss_kb', '?'), memory.get('pss_kb', '?'))
+
+def on_starting(server):
+    import metrics
+    metrics.clear_dir()
+
+def when_ready(server):
+    from app import process_memory
+    server.log.info('master %s', format_memory(process_memory()))
+
+def pre_fork(server, worker):
+    gc.collect()
+    gc.freeze()
+
+def post_fork(server, worker):
+    import app
+    # Only workers watch the data file; the master never serves a request.
+    app.datasets.start_watching()
+    app.pool_master[0] = server.pid
+
+def worker_exit(server, worker):
+    import metrics
+    from app import process_memory
+    metrics.flush()
+    # Right after fork every page is still shared; by exit the worker has done
+    # its real work, so this is the figure to size the pool with (live numbers
+    # for every worker are at /_workers/memory).
+    server.log.info('worker %s exiting %s', worker.pid, format_memory(process_memory()))
+
+def child_exit(server, worker):
+    server.log.info('worker %s exited', worker.pid)
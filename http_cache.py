@@ -0,0 +1,125 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+
+from flask import Response, g, request
+
+# Conditional responses for the Flask server behind the Dash app.
+#
+#   GET /_dash-dependencies      ETag from the release (code + assets)
+#   GET /_dash-layout            ETag from the release and the dataset version
+#   POST /_dash-update-component ETag from the release, the dataset version,
+#                                the output and the input/state values
+#
+# A matching If-None-Match is answered with 304 before Dash does any work, so a
+# revalidation costs neither the layout build nor the callback. Flask-Compress
+# appends ":gzip" / ":br" to strong ETags; the suffix is ignored when matching.
+#
+# Callback responses are only tagged for synchronous server callbacks (their
+# output depends on nothing else) and are marked public so a reverse proxy
+# keying on the request body may store them; CALLBACK_S_MAXAGE lets it serve
+# them without revalidating. Background callbacks and their polling requests
+# are left alone. Fingerprinted component bundles and ?m= assets are immutable.
+#
+# The index page is never tagged: Dash signs a fresh end_id into _dash-config on
+# every load and binds background-callback handles to it, so it is served as
+# private, no-store and each load gets its own.
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+RELEASE_PATHS = ['/_dash-dependencies']
+INDEX_PATH = '/'
+NO_STORE = 'private, no-store'
+LAYOUT_PATH = '/_dash-layout'
+CALLBACK_PATH = '/_dash-update-component'
+
+counters = {'tagged': 0, 'not_modified': 0}
+counters_lock = threading.Lock()
+
+def release_id(root):
+    digest = hashlib.sha256(os.environ.get('RELEASE_ID', '').encode())
+    paths = glob.glob(os.path.join(root, '*.py')) + glob.glob(os.path.join(root, 'assets', '*'))
+    for path in sorted(paths):
+        with open(path, 'rb') as f:
+            digest.update(path.encode() + b'\0' + f.read())
+    return digest.hexdigest()[:16]
+
+def make_tag(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+def values(items):
+    # Pattern-matching inputs arrive as nested lists of {id, property, value}.
+    return [values(item) if isinstance(item, list) else item.get('value') for item in items or []]
+
+def count(name):
+    with counters_lock:
+        counters[name] += 1
+
+def stats():
+    with counters_lock:
+        return dict(counters)
+
+def install(dash_app, version, root=None, callback_s_maxage=None):
+    server = dash_app.server
+    release = release_id(root or server.root_path)
+    if callback_s_maxage is None:
+        callback_s_maxage = int(os.environ.get('CALLBACK_S_MAXAGE', '0'))
+    callback_control = 'public, max-age=0, must-revalidate'
+    if callback_s_maxage > 0:
+        callback_control += ', s-maxage=%d' % callback_s_maxage
+    deterministic = []
+
+    def synchronous_outputs():
+        if not deterministic:
+            deterministic.append({
+                output for output, callback in dash_app.callback_map.items()
+                if not callback.get('background')
+            })
+        return deterministic[0]
+
+    def request_tag():
+        if request.method == 'GET' and request.path in RELEASE_PATHS:
+            return make_tag(release), REVALIDATE
+        if request.method == 'GET' and request.path == LAYOUT_PATH:
+            return make_tag(release, version()), REVALIDATE
+        if request.method == 'POST' and request.path == CALLBACK_PATH and not request.args:
+            body = request.get_json(silent=True) or {}
+            output = body.get('output')
+            if output in synchronous_outputs():
+                return make_tag(release, version(), output, values(body.get('inputs')), values(body.get('state'))), callback_control
+        return None, None
+
+    @server.before_request
+    def answer_not_modified():
+        tag, control = request_tag()
+        if tag is None:
+            return None
+        g.http_cache = tag, control
+        for sent in request.if_none_match.as_set():
+            if sent.split(':', 1)[0] == tag:
+                count('not_modified')
+                response = Response(status=304)
+                response.set_etag(sent)
+                response.headers['Cache-Control'] = control
+                return response
+        return None
+
+    @server.after_request
+    def tag_response(response):
+        if response.status_code != 200:
+            return response
+        if request.method == 'GET' and request.path == INDEX_PATH:
+            response.headers['Cache-Control'] = NO_STORE
+            return response
+        if request.path.startswith('/_dash-component-suites/') or (request.path.startswith('/assets/') and 'm' in request.args):
+            response.headers['Cache-Control'] = IMMUTABLE
+            return response
+        tag, control = g.pop('http_cache', (None, None))
+        if tag is not None:
+            count('tagged')
+            response.set_etag(tag)
+            response.headers['Cache-Control'] = control
+            response.vary.add('Accept-Encoding')
+        return response
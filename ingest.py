@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+# Streaming ingest for census extracts too large to hold as a frame. The CSV is
+# read in bounded chunks; each chunk is folded into an (occupation x geography
+# x gender) int64 array and then dropped, so peak memory depends on the number
+# of distinct occupations and geographies, not on the number of input rows.
+#
+# Counts are parsed by the C parser with thousands=',' (no per-cell string
+# cleanup); suppressed cells ("x", "..", "F") become NaN and the row is skipped,
+# as load_and_clean_data always did. The NOC hierarchy is already present as
+# rows in the extract, so no roll-up is needed here.
+
+COUNT_COLUMNS = ['Total', 'Men', 'Women']
+GEOGRAPHY_COLUMNS = ['Geography', 'GEO', 'Province']
+NATIONAL = 'Canada'
+NA_VALUES = ['x', 'X', '..', '...', 'F']
+DEFAULT_CHUNKSIZE = 200000
+
+class Accumulator:
+    def __init__(self):
+        self.occupation_ids = {}
+        self.geography_ids = {}
+        self.counts = np.zeros((1024, 1, len(COUNT_COLUMNS)), dtype=np.int64)
+
+    def ids(self, values, known):
+        codes, uniques = pd.factorize(values)
+        mapping = np.empty(len(uniques), dtype=np.int64)
+        for i, value in enumerate(uniques):
+            mapping[i] = known.setdefault(value, len(known))
+        return mapping[codes]
+
+    def reserve(self):
+        n_occ, n_geo = len(self.occupation_ids), len(self.geography_ids)
+        cap_occ, cap_geo = self.counts.shape[:2]
+        if n_occ > cap_occ or n_geo > cap_geo:
+            grow_occ = max(n_occ, cap_occ * 2) - cap_occ if n_occ > cap_occ else 0
+            grow_geo = max(n_geo, cap_geo * 2) - cap_geo if n_geo > cap_geo else 0
+            self.counts = np.pad(self.counts, ((0, grow_occ), (0, grow_geo), (0, 0)))
+
+    def add(self, occupations, geographies, values):
+        occupation_ids = self.ids(occupations, self.occupation_ids)
+        geography_ids = self.ids(geographies, self.geography_ids)
+        self.reserve()
+        np.add.at(self.counts, (occupation_ids, geography_ids), values)
+
+    def result(self):
+        n_occ, n_geo = len(self.occupation_ids), len(self.geography_ids)
+        return {
+            'occupations': list(self.occupation_ids),
+            'geographies': list(self.geography_ids),
+            'counts': self.counts[:n_occ, :n_geo].copy()
+        }
+
+def aggregate_csv(path, chunksize=DEFAULT_CHUNKSIZE):
+    header = pd.read_csv(path, nrows=0).columns
+    geography_column = next((c for c in GEOGRAPHY_COLUMNS if c in header), None)
+    usecols = ['Occupation'] + COUNT_COLUMNS + ([geography_column] if geography_column else [])
+    dtypes = {'Occupation': object}
+    if geography_column:
+        dtypes[geography_column] = object
+    accumulator = Accumulator()
+    reader = pd.read_csv(
+        path, usecols=usecols, dtype=dtypes, thousands=',', na_values=NA_VALUES,
+        chunksize=chunksize
+    )
+    for chunk in reader:
+        for col in COUNT_COLUMNS:
+            if chunk[col].dtype == object:
+                # Only hit when a chunk carries an unexpected token.
+                chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+        values = chunk[COUNT_COLUMNS].to_numpy(dtype=np.float64)
+        keep = ~np.isnan(values).any(axis=1) & chunk['Occupation'].notna().to_numpy()
+        geographies = chunk[geography_column][keep] if geography_column else np.full(keep.sum(), NATIONAL, dtype=object)
+        accumulator.add(chunk['Occupation'][keep], geographies, values[keep].astype(np.int64))
+    return accumulator.result()
+
+def national_counts(aggregates):
+    geographies = aggregates['geographies']
+    if NATIONAL in geographies:
+        return aggregates['counts'][:, geographies.index(NATIONAL)]
+    return aggregates['counts'].sum(axis=1)
+
+def national_frame(aggregates):
+    counts = national_counts(aggregates)
+    data = {'Occupation': aggregates['occupations']}
+    for i, col in enumerate(COUNT_COLUMNS):
+        data[col] = counts[:, i]
+    return pd.DataFrame(data)
+
+# Observed (occupation x province) Total counts in the order of province_names,
+# -1 for provinces the extract does not cover, or None when it has no
+# provincial geography at all.
+def province_totals(aggregates, province_names):
+    geographies = pd.Index(aggregates['geographies'])
+    columns = geographies.get_indexer(province_names)
+    if (columns < 0).all():
+        return None
+    totals = np.full((len(aggregates['occupations']), len(province_names)), -1, dtype=np.int64)
+    found = columns >= 0
+    totals[:, found] = aggregates['counts'][:, columns[found], 0]
+    return totals
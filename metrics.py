@@ -0,0 +1,312 @@
+import bisect
+import collections
+import fcntl
+import functools
+import glob
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-stage callback instrumentation exported in Prometheus text format.
+#
+# Callbacks are wrapped with instrument(callback_id); inside them, stage(name)
+# times a block and observe_rows(n) records how many rows it touched. Payload
+# bytes and serialization time come from figure_builder (record_size, smaller).
+#
+# Under gunicorn every worker has its own registry. When METRICS_DIR is set a
+# thread in each worker writes its registry to METRICS_DIR/metrics_<pid>.json
+# every FLUSH_INTERVAL while it changes, and the /metrics handler flushes its
+# own registry and then sums only the files, so every worker answering a scrape
+# sees the same totals. Files of exited workers are kept so counters stay
+# monotonic; gunicorn.conf.py clears the directory when the master starts.
+#
+# PROFILE_SLOWEST=N turns on a sampling profiler that keeps collapsed stacks
+# (flamegraph.pl / speedscope input) for the N slowest callback invocations.
+
+BUCKETS = {
+    'seconds': [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+    'rows': [1, 10, 100, 1000, 10000, 100000, 1000000, 10000000],
+    'bytes': [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+}
+HISTOGRAMS = {
+    'dash_callback_stage_seconds': ('seconds', 'Time spent per callback stage.'),
+    'dash_callback_rows': ('rows', 'Rows selected per callback invocation.'),
+    'dash_callback_payload_bytes': ('bytes', 'Serialized callback payload size.')
+}
+MAX_INPUT_LABELS = 50
+METRICS_DIR = os.environ.get('METRICS_DIR')
+FLUSH_INTERVAL = 1.0
+
+registry = {}
+registry_lock = threading.Lock()
+input_labels = collections.defaultdict(set)
+context = threading.local()
+flush_lock = threading.Lock()
+# changes counts observations; the flusher writes when it moved since last time.
+flusher = {'thread': None, 'changes': 0, 'flushed': 0, 'enabled': True}
+
+def input_label(callback_id, args):
+    from figure_cache import normalize_inputs
+    label = repr(normalize_inputs(args))
+    seen = input_labels[callback_id]
+    # Keep label cardinality bounded: noc-dropdown alone has thousands of subsets.
+    if label not in seen and len(seen) >= MAX_INPUT_LABELS:
+        return 'other'
+    seen.add(label)
+    return label
+
+def observe(name, value, **labels):
+    if not hasattr(context, 'callback'):
+        return
+    labels = dict(labels, callback=context.callback, inputs=context.inputs)
+    key = (name, tuple(sorted(labels.items())))
+    buckets = BUCKETS[HISTOGRAMS[name][0]]
+    with registry_lock:
+        entry = registry.get(key)
+        if entry is None:
+            entry = registry[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        index = bisect.bisect_left(buckets, value)
+        if index < len(buckets):
+            entry['buckets'][index] += 1
+        entry['sum'] += value
+        entry['count'] += 1
+        flusher['changes'] += 1
+
+@contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('dash_callback_stage_seconds', time.perf_counter() - started, stage=name)
+
+def observe_rows(count):
+    observe('dash_callback_rows', count)
+
+def observe_bytes(count):
+    observe('dash_callback_payload_bytes', count)
+
+# `labels` picks the arguments used for the inputs label when the raw ones
+# (clickData, say) would make poor label values.
+def instrument(callback_id, labels=None):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            # Instrumented functions can nest (a Patch-sending callback around
+            # the memoized figure builder); the outer context is restored after.
+            outer = getattr(context, 'callback', None), getattr(context, 'inputs', None)
+            context.callback = callback_id
+            context.inputs = input_label(callback_id, labels(*args) if labels else args)
+            ensure_flusher()
+            sampled = sampler.start() if sampler is not None and outer[0] is None else None
+            started = time.perf_counter()
+            try:
+                with stage('total'):
+                    return func(*args)
+            finally:
+                if sampled is not None:
+                    sampler.finish(sampled, time.perf_counter() - started, callback_id, context.inputs)
+                if outer[0] is None:
+                    del context.callback, context.inputs
+                else:
+                    context.callback, context.inputs = outer
+        return wrapper
+    return decorator
+
+def snapshot_registry():
+    with registry_lock:
+        return [[name, list(labels), dict(entry, buckets=list(entry['buckets']))] for (name, labels), entry in registry.items()]
+
+def worker_file(pid=None):
+    return os.path.join(METRICS_DIR, 'metrics_%d.json' % (pid or os.getpid()))
+
+def flush():
+    if not METRICS_DIR:
+        return
+    path = worker_file()
+    tmp_path = path + '.tmp'
+    with flush_lock:
+        changes = flusher['changes']
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot_registry(), f)
+        os.replace(tmp_path, path)
+        flusher['flushed'] = changes
+
+def run_flusher():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        if flusher['changes'] != flusher['flushed']:
+            try:
+                flush()
+            except OSError:
+                pass
+
+def ensure_flusher():
+    # Started lazily so the thread exists in each forked worker, not the master.
+    if not METRICS_DIR or not flusher['enabled']:
+        return
+    if flusher['thread'] is None or not flusher['thread'].is_alive():
+        flusher['thread'] = threading.Thread(target=run_flusher, name='metrics-flusher', daemon=True)
+        flusher['thread'].start()
+
+def after_fork():
+    # A job forked while the flusher held a lock must not inherit it held.
+    global registry_lock, flush_lock
+    registry_lock = threading.Lock()
+    flush_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=after_fork)
+
+# Background callback jobs (background_jobs.py) are short-lived processes
+# forked from a worker. Each starts from an empty registry and adds what it
+# observed to one shared METRICS_DIR/metrics_jobs.json, so the directory does
+# not grow a file per job.
+def start_job():
+    with registry_lock:
+        registry.clear()
+    # A job flushes once, into the shared jobs file, when it ends.
+    flusher['enabled'] = False
+
+def flush_job():
+    if not METRICS_DIR:
+        return
+    path = os.path.join(METRICS_DIR, 'metrics_jobs.json')
+    with open(path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        sources = [snapshot_registry()]
+        try:
+            with open(path) as f:
+                sources.append(json.load(f))
+        except (OSError, ValueError):
+            pass
+        merged = merge(sources)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump([[name, list(labels), entry] for (name, labels), entry in merged.items()], f)
+        os.replace(tmp_path, path)
+
+def clear_dir():
+    if METRICS_DIR:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        for path in glob.glob(os.path.join(METRICS_DIR, 'metrics_*.json')):
+            os.remove(path)
+
+def collect():
+    if not METRICS_DIR:
+        return merge([snapshot_registry()])
+    # Everything comes from the files, this worker's included once it is
+    # flushed, so totals don't depend on which worker answers the scrape.
+    flush()
+    sources = []
+    for path in glob.glob(os.path.join(METRICS_DIR, 'metrics_*.json')):
+        try:
+            with open(path) as f:
+                sources.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return merge(sources)
+
+def merge(sources):
+    merged = {}
+    for source in sources:
+        for name, labels, entry in source:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            total = merged.setdefault(key, {'buckets': [0] * len(entry['buckets']), 'sum': 0.0, 'count': 0})
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], entry['buckets'])]
+            total['sum'] += entry['sum']
+            total['count'] += entry['count']
+    return merged
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    return '{%s}' % ','.join('%s="%s"' % (k, escape(v)) for k, v in pairs)
+
+def render():
+    merged = collect()
+    lines = []
+    for name, (kind, help_text) in HISTOGRAMS.items():
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s histogram' % name)
+        for (metric, labels), entry in sorted(merged.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS[kind], entry['buckets']):
+                cumulative += count
+                lines.append('%s_bucket%s %d' % (name, format_labels(labels, le=bound), cumulative))
+            lines.append('%s_bucket%s %d' % (name, format_labels(labels, le='+Inf'), entry['count']))
+            lines.append('%s_sum%s %r' % (name, format_labels(labels), entry['sum']))
+            lines.append('%s_count%s %d' % (name, format_labels(labels), entry['count']))
+    return '\n'.join(lines) + '\n'
+
+class Sampler:
+    def __init__(self, keep, interval=0.002):
+        self.keep = keep
+        self.interval = interval
+        self.active = {}
+        self.slowest = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def ensure_thread(self):
+        # Started lazily so the thread exists in each forked worker, not the master.
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run, name='callback-sampler', daemon=True)
+            self.thread.start()
+
+    def start(self):
+        self.ensure_thread()
+        ident = threading.get_ident()
+        stacks = collections.Counter()
+        with self.lock:
+            self.active[ident] = stacks
+        return ident
+
+    def finish(self, ident, duration, callback_id, inputs):
+        with self.lock:
+            stacks = self.active.pop(ident, None)
+            if not stacks:
+                return
+            item = (duration, time.time(), callback_id, inputs, dict(stacks))
+            if len(self.slowest) < self.keep:
+                heapq.heappush(self.slowest, item)
+            elif duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, item)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                for ident, stacks in self.active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[collapse(frame)] += 1
+
+    def report(self):
+        with self.lock:
+            slowest = sorted(self.slowest, reverse=True)
+        lines = []
+        for duration, finished, callback_id, inputs, stacks in slowest:
+            lines.append('# %s %s %.1fms at %s' % (callback_id, inputs, duration * 1000, time.strftime('%H:%M:%S', time.localtime(finished))))
+            for stack, count in sorted(stacks.items()):
+                lines.append('%s;%s %d' % (callback_id, stack, count))
+        return '\n'.join(lines) + '\n'
+
+def collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+sampler = Sampler(int(os.environ['PROFILE_SLOWEST'])) if os.environ.get('PROFILE_SLOWEST') else None
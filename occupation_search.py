@@ -0,0 +1,112 @@
+import bisect
+import re
+import unicodedata
+
+import numpy as np
+
+# Typeahead over every NOC row, built once per dataset version.
+#
+# Titles are normalized (case, accents, punctuation) and split into trigrams;
+# each trigram maps to the sorted rows containing it. A query term of three or
+# more characters is answered by counting, per row, how many of its trigrams
+# the row has and keeping the rows that have all of them, then confirming the
+# substring on that short list. Shorter terms fall back to a sorted word list
+# (word-prefix match), and digit terms match NOC code prefixes by bisection.
+#
+# Results are ranked by match quality, then by employment Total:
+#
+#   0 exact code   1 code prefix   2 title prefix   3 word prefix   4 substring
+
+EXACT_CODE, CODE_PREFIX, TITLE_PREFIX, WORD_PREFIX, SUBSTRING = range(5)
+NGRAM = 3
+DEFAULT_LIMIT = 20
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text.lower()).split())
+
+def ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+def build(occupations, codes, depth, totals):
+    titles = []
+    for occupation, code in zip(occupations, codes):
+        title = occupation[len(code):] if code else occupation
+        titles.append(normalize(title))
+    postings = {}
+    words = []
+    for row, title in enumerate(titles):
+        for gram in ngrams(title):
+            postings.setdefault(gram, []).append(row)
+        for word in set(title.split()):
+            words.append((word, row))
+    words.sort()
+    numbered = sorted((code, row) for row, code in enumerate(codes) if code)
+    return {
+        'occupations': list(occupations),
+        'row_by_occupation': {occupation: row for row, occupation in enumerate(occupations)},
+        'titles': titles,
+        'depth': np.asarray(depth),
+        'totals': np.asarray(totals, dtype=np.int64),
+        'postings': {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()},
+        'words': [word for word, _ in words],
+        'word_rows': np.array([row for _, row in words], dtype=np.int32),
+        'codes': [code for code, _ in numbered],
+        'code_rows': np.array([row for _, row in numbered], dtype=np.int32)
+    }
+
+def prefix_range(keys, prefix):
+    return bisect.bisect_left(keys, prefix), bisect.bisect_left(keys, prefix + '\x7f')
+
+def match_term(index, term):
+    # Returns {row: quality} for one query term.
+    if term.isdigit():
+        lo, hi = prefix_range(index['codes'], term)
+        return {
+            int(row): EXACT_CODE if index['codes'][i] == term else CODE_PREFIX
+            for i, row in zip(range(lo, hi), index['code_rows'][lo:hi])
+        }
+    if len(term) < NGRAM:
+        lo, hi = prefix_range(index['words'], term)
+        rows = np.unique(index['word_rows'][lo:hi])
+    else:
+        grams = ngrams(term)
+        lists = [index['postings'].get(gram) for gram in grams]
+        if any(rows is None for rows in lists):
+            return {}
+        counts = np.bincount(np.concatenate(lists), minlength=len(index['titles']))
+        rows = np.flatnonzero(counts == len(grams))
+    matches = {}
+    for row in rows.tolist():
+        title = index['titles'][row]
+        if title.startswith(term):
+            matches[row] = TITLE_PREFIX
+        elif title.find(' ' + term) >= 0:
+            matches[row] = WORD_PREFIX
+        elif term in title:
+            matches[row] = SUBSTRING
+    return matches
+
+def search(index, text, limit=DEFAULT_LIMIT, max_depth=None):
+    terms = normalize(text).split()
+    if not terms:
+        return []
+    # Every term must match; a row ranks by its weakest term.
+    matches = match_term(index, terms[0])
+    for term in terms[1:]:
+        if not matches:
+            break
+        other = match_term(index, term)
+        matches = {row: max(quality, other[row]) for row, quality in matches.items() if row in other}
+    if max_depth is not None:
+        matches = {row: quality for row, quality in matches.items() if index['depth'][row] <= max_depth}
+    if not matches:
+        return []
+    rows = np.fromiter(matches, dtype=np.int64, count=len(matches))
+    quality = np.fromiter(matches.values(), dtype=np.int64, count=len(matches))
+    order = np.lexsort((rows, -index['totals'][rows], quality))[:limit]
+    return rows[order].tolist()
+
+def rows_for(index, occupations):
+    rows = [index['row_by_occupation'][occ] for occ in occupations if occ in index['row_by_occupation']]
+    return np.array(sorted(rows), dtype=np.int64)
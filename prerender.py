@@ -0,0 +1,130 @@
+import argparse
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from figure_cache import make_key
+
+# Ahead-of-time rendering of every server callback payload over the finite
+# part of the input space:
+#
+#   python prerender.py                  render into ./prerendered for data.csv
+#   python prerender.py --noc-max 4      cover noc-dropdown subsets up to 4
+#                                        top-level groups (default 3)
+#
+# Store layout, content-addressed and versioned by the dataset hash:
+#
+#   <root>/objects/<sha256>.json         one serialized payload, shared between
+#                                        inputs (and versions) that render alike
+#   <root>/<version>/manifest.json       figure_cache key -> object hash
+#
+# app.py loads the manifest for the current dataset version into the Dataset
+# snapshot, and FigureCache answers from it before the LRU, so covered inputs
+# never reach pandas at request time. Anything not in the manifest (larger
+# noc-dropdown selections, a dataset nobody prerendered) is computed live.
+
+DEFAULT_ROOT = 'prerendered'
+DEFAULT_NOC_MAX = 3
+
+# figure_cache callback id -> app function
+CALLBACKS = {
+    'essential-services-data': 'update_essential_services_data',
+    'gender-employment-data': 'update_gender_employment_data',
+    'engineering-manpower-data': 'update_engineering_manpower_data',
+    'custom-insight-graph': 'update_custom_insight_graph',
+    'noc-drilldown-graph': 'noc_drilldown_figure'
+}
+
+def manifest_path(root, version):
+    return os.path.join(root, version, 'manifest.json')
+
+def object_path(root, digest):
+    return os.path.join(root, 'objects', digest + '.json')
+
+def load(root, version):
+    try:
+        with open(manifest_path(root, version)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    objects = {}
+    entries = {}
+    for key, digest in manifest['entries'].items():
+        if digest not in objects:
+            try:
+                with open(object_path(root, digest)) as f:
+                    objects[digest] = json.load(f)
+            except (OSError, ValueError):
+                # A missing object only loses that entry; it is computed live.
+                continue
+        entries[key] = objects[digest]
+    return entries
+
+def subsets(values, max_size):
+    for size in range(1, max_size + 1):
+        for combo in itertools.combinations(values, size):
+            yield list(combo)
+
+def cases(app, noc_max):
+    data = app.datasets.current
+    nocs = data.noc_top_level_df['Occupation'].unique().tolist()
+    inputs = {
+        'essential-services-data': [(s,) for s in ['all'] + list(app.SERVICE_FILTERS)],
+        # The layout preselects the first three groups.
+        'gender-employment-data': [([],), (nocs[:3],)] + [(s,) for s in subsets(nocs, noc_max)],
+        'engineering-manpower-data': [([],)] + [(s,) for s in subsets(app.ENGINEERING_TYPES, len(app.ENGINEERING_TYPES))],
+        'custom-insight-graph': list(itertools.product(app.CATEGORY_FILTERS, ['hierarchy', 'parity'])),
+        'noc-drilldown-graph': [(node,) for node in data.drilldown['children']]
+    }
+    return [(callback_id, args) for callback_id in CALLBACKS for args in inputs[callback_id]]
+
+def render(case):
+    # Runs in a forked pool process that inherited the loaded app module.
+    import app
+    from plotly.io.json import to_json_plotly
+    callback_id, args = case
+    func = inspect.unwrap(getattr(app, CALLBACKS[callback_id]))
+    raw = to_json_plotly(func(*args)).encode()
+    return make_key(callback_id, args, app.datasets.current.version), hashlib.sha256(raw).hexdigest(), raw
+
+def build(root, noc_max, processes=None):
+    import app
+    version = app.datasets.current.version
+    todo = cases(app, noc_max)
+    entries = {}
+    written = 0
+    os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+    os.makedirs(os.path.join(root, version), exist_ok=True)
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for key, digest, raw in pool.map(render, todo, chunksize=8):
+            entries[key] = digest
+            path = object_path(root, digest)
+            if not os.path.exists(path):
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(raw)
+                os.replace(path + '.tmp', path)
+                written += 1
+    manifest = {'version': version, 'built_at': time.time(), 'noc_max': noc_max, 'entries': entries}
+    path = manifest_path(root, version)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    # Written last, so a worker never loads a manifest whose objects are missing.
+    os.replace(path + '.tmp', path)
+    return version, len(todo), written
+
+def main():
+    parser = argparse.ArgumentParser(description='Prerender callback payloads for every finite input combination.')
+    parser.add_argument('--root', default=os.environ.get('PRERENDER_DIR', DEFAULT_ROOT))
+    parser.add_argument('--noc-max', type=int, default=DEFAULT_NOC_MAX, help='largest noc-dropdown subset to cover')
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    version, count, written = build(args.root, args.noc_max, args.processes)
+    print('version %s: %d payloads, %d new objects in %.1fs' % (version, count, written, time.perf_counter() - started))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Single-file columnar snapshot of the cleaned data.csv:
+#
+#   MAGIC | 8-byte header length | JSON header | 64-byte aligned column arrays
+#
+# Columns are plain NumPy arrays, so readers np.memmap them read-only and every
+# worker on the host shares the same page-cache pages instead of parsing the CSV.
+# Extra n-d arrays (e.g. observed province totals from ingest) ride along in the
+# same file and come back as read-only memmaps too.
+
+MAGIC = b'NOCSNAP2'
+ALIGN = 64
+COUNT_COLUMNS = ['Total', 'Men', 'Women']
+
+def snapshot_path(csv_path):
+    return csv_path + '.snapshot'
+
+def split_occupation(occupation):
+    code, _, title = occupation.partition(' ')
+    if code.isdigit():
+        return int(code), len(code), title
+    return -1, 0, occupation
+
+def encode(df):
+    parts = [split_occupation(occ) for occ in df['Occupation'].astype(str)]
+    titles, title_codes = np.unique([p[2] for p in parts], return_inverse=True)
+    columns = {
+        'code': np.array([p[0] for p in parts], dtype=np.int32),
+        'code_length': np.array([p[1] for p in parts], dtype=np.int8),
+        'title': title_codes.astype(np.int32)
+    }
+    for col in COUNT_COLUMNS:
+        columns[col] = df[col].to_numpy(dtype=np.int32)
+    return columns, titles.tolist()
+
+def write_snapshot(df, path, version, arrays=None):
+    columns, titles = encode(df)
+    extra = {'array:' + name: np.ascontiguousarray(array) for name, array in (arrays or {}).items()}
+    columns.update(extra)
+    layout = {}
+    offset = 0
+    for name, array in columns.items():
+        offset = -(-offset // ALIGN) * ALIGN
+        layout[name] = {'dtype': array.dtype.str, 'offset': offset, 'shape': list(array.shape)}
+        offset += array.nbytes
+    header = json.dumps({'version': version, 'rows': len(df), 'columns': layout, 'titles': titles}).encode()
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for name, array in columns.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    # Readers either see the previous complete snapshot or the new one.
+    os.replace(tmp_path, path)
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None, 0
+        length = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(length))
+    return header, -(-(len(MAGIC) + 8 + length) // ALIGN) * ALIGN
+
+# Returns (frame, arrays), or (None, None) when the snapshot is missing or was
+# built from a different version of the CSV.
+def read_snapshot(path, version):
+    try:
+        header, data_start = read_header(path)
+    except (OSError, ValueError):
+        return None, None
+    if header is None or header['version'] != version:
+        return None, None
+    columns = {}
+    for name, spec in header['columns'].items():
+        shape = tuple(spec['shape'])
+        if 0 in shape:
+            columns[name] = np.empty(shape, dtype=spec['dtype'])
+            continue
+        columns[name] = np.memmap(
+            path, dtype=np.dtype(spec['dtype']), mode='r',
+            offset=data_start + spec['offset'], shape=shape
+        )
+    titles = header['titles']
+    occupations = [
+        '%0*d %s' % (length, code, titles[title]) if length else titles[title]
+        for code, length, title in zip(columns['code'].tolist(), columns['code_length'].tolist(), columns['title'].tolist())
+    ]
+    data = {'Occupation': occupations}
+    for col in COUNT_COLUMNS:
+        data[col] = columns[col]
+    arrays = {name[len('array:'):]: array for name, array in columns.items() if name.startswith('array:')}
+    return pd.DataFrame(data, copy=False), arrays
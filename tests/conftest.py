@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Tests import the top-level modules and app.py reads data.csv relative to the
+# working directory, so run from the repository root.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+import ingest
+
+# The loader app.py used before ingest.py, kept here as the reference.
+def load_and_clean_data(filepath):
+    df = pd.read_csv(filepath)
+    for col in ['Total', 'Men', 'Women']:
+        df[col] = df[col].astype(str).str.replace(',', '').str.replace('"', '')
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df = df.dropna(subset=['Total', 'Men', 'Women'])
+    return df
+
+def test_national_frame_matches_old_loader():
+    expected = load_and_clean_data('data.csv').reset_index(drop=True)
+    df = ingest.national_frame(ingest.aggregate_csv('data.csv'))
+    assert df['Occupation'].tolist() == expected['Occupation'].tolist()
+    for col in ['Total', 'Men', 'Women']:
+        np.testing.assert_array_equal(df[col].to_numpy(), expected[col].to_numpy())
+
+def test_chunk_size_does_not_change_result():
+    whole = ingest.national_frame(ingest.aggregate_csv('data.csv'))
+    chunked = ingest.national_frame(ingest.aggregate_csv('data.csv', chunksize=7))
+    pd.testing.assert_frame_equal(whole, chunked)
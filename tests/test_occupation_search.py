@@ -0,0 +1,83 @@
+import occupation_search
+
+OCCUPATIONS = [
+    'Passenger attendants',
+    '21311 Civil engineering technologists',
+    '2131 Civil engineers',
+    '0211 Engineering managers',
+    '213 Civil and mechanical engineers',
+    'Équipe de génie'
+]
+
+def make_index(occupations=OCCUPATIONS, totals=None):
+    codes = [occ.split(' ', 1)[0] if occ[:1].isdigit() else '' for occ in occupations]
+    depth = [len(code) for code in codes]
+    # Larger totals on the weaker matches, so ranking by quality is what's tested.
+    totals = totals or [1000 - 100 * row for row in range(len(occupations))]
+    return occupation_search.build(occupations, codes, depth, totals)
+
+def titles(index, rows):
+    return [index['occupations'][row] for row in rows]
+
+def test_code_query_ranks_exact_code_before_code_prefix():
+    index = make_index()
+    assert titles(index, occupation_search.search(index, '2131')) == [
+        '2131 Civil engineers',
+        '21311 Civil engineering technologists'
+    ]
+
+def test_code_prefix_keeps_leading_zeros():
+    index = make_index()
+    assert titles(index, occupation_search.search(index, '02')) == ['0211 Engineering managers']
+    assert occupation_search.search(index, '2') == occupation_search.search(index, '21')
+
+def test_text_query_ranks_title_prefix_word_prefix_substring():
+    index = make_index()
+    assert titles(index, occupation_search.search(index, 'eng')) == [
+        '0211 Engineering managers',
+        # Word prefixes tie on quality and are ordered by Total.
+        '21311 Civil engineering technologists',
+        '2131 Civil engineers',
+        '213 Civil and mechanical engineers',
+        'Passenger attendants'
+    ]
+
+def test_short_terms_match_word_prefixes_only():
+    index = make_index()
+    assert titles(index, occupation_search.search(index, 'ci')) == [
+        '21311 Civil engineering technologists',
+        '2131 Civil engineers',
+        '213 Civil and mechanical engineers'
+    ]
+
+def test_every_term_must_match_and_weakest_term_ranks():
+    index = make_index()
+    assert titles(index, occupation_search.search(index, 'civil mech')) == ['213 Civil and mechanical engineers']
+    assert occupation_search.search(index, 'civil nurse') == []
+
+def test_ties_on_quality_break_on_total():
+    index = make_index(totals=[1, 1, 10, 1, 1000, 1])
+    assert titles(index, occupation_search.search(index, 'civil')) == [
+        '213 Civil and mechanical engineers',
+        '2131 Civil engineers',
+        '21311 Civil engineering technologists'
+    ]
+
+def test_accents_and_punctuation_are_normalized():
+    index = make_index()
+    assert titles(index, occupation_search.search(index, 'GENIE')) == ['Équipe de génie']
+    assert titles(index, occupation_search.search(index, 'civil-engineers!')) == [
+        '2131 Civil engineers',
+        '213 Civil and mechanical engineers'
+    ]
+
+def test_limit_and_max_depth():
+    index = make_index()
+    assert len(occupation_search.search(index, 'eng', limit=2)) == 2
+    assert titles(index, occupation_search.search(index, 'civil', max_depth=3)) == ['213 Civil and mechanical engineers']
+
+def test_empty_and_unknown_queries():
+    index = make_index()
+    assert occupation_search.search(index, '') == []
+    assert occupation_search.search(index, ' - ') == []
+    assert occupation_search.search(index, 'zzqx') == []
@@ -0,0 +1,23 @@
+import numpy as np
+
+from app import select_extremes
+
+def plain_sort(ranks, k):
+    order = np.argsort(ranks, kind='stable')
+    return np.concatenate([order[:k], order[len(ranks) - k:]]) if k else order[:0]
+
+def test_matches_plain_sort():
+    rng = np.random.default_rng(0)
+    for n in [1, 2, 3, 10, 21, 500]:
+        ranks = rng.permutation(n) + 1
+        for k in sorted({0, 1, n // 2, min(10, n // 2)}):
+            np.testing.assert_array_equal(select_extremes(ranks, k), plain_sort(ranks, k))
+
+def test_ranks_come_back_ascending():
+    ranks = np.array([7, 3, 9, 1, 5, 8, 2, 6, 4, 10])
+    assert ranks[select_extremes(ranks, 3)].tolist() == [1, 2, 3, 8, 9, 10]
+
+def test_empty_for_non_positive_k():
+    ranks = np.array([2, 1, 3])
+    assert len(select_extremes(ranks, 0)) == 0
+    assert len(select_extremes(ranks, -1)) == 0
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+import snapshot
+
+def sample_frame():
+    return pd.DataFrame({
+        'Occupation': [
+            'Total - Occupation',
+            '00010 Legislators',
+            '0 Legislative and senior management occupations',
+            '000 Senior managers',
+            '21311 Civil engineers',
+            'All occupations'
+        ],
+        'Total': [100, 5, 7, 0, 1234567, 100],
+        'Men': [60, 3, 4, 0, 1000000, 60],
+        'Women': [40, 2, 3, 0, 234567, 40]
+    })
+
+def test_round_trip_keeps_codes_and_counts(tmp_path):
+    df = sample_frame()
+    path = str(tmp_path / 'data.csv.snapshot')
+    snapshot.write_snapshot(df, path, 'v1')
+    restored, arrays = snapshot.read_snapshot(path, 'v1')
+    assert restored['Occupation'].tolist() == df['Occupation'].tolist()
+    for col in snapshot.COUNT_COLUMNS:
+        assert restored[col].tolist() == df[col].tolist()
+    assert arrays == {}
+
+def test_round_trip_keeps_extra_arrays(tmp_path):
+    df = sample_frame()
+    observed = np.arange(len(df) * 3, dtype=np.int64).reshape(len(df), 3) - 1
+    path = str(tmp_path / 'data.csv.snapshot')
+    snapshot.write_snapshot(df, path, 'v1', arrays={'observed': observed, 'empty': np.empty((0, 3))})
+    _, arrays = snapshot.read_snapshot(path, 'v1')
+    assert sorted(arrays) == ['empty', 'observed']
+    assert arrays['observed'].dtype == observed.dtype
+    np.testing.assert_array_equal(arrays['observed'], observed)
+    assert arrays['empty'].shape == (0, 3)
+
+def test_version_mismatch_and_bad_files(tmp_path):
+    path = str(tmp_path / 'data.csv.snapshot')
+    assert snapshot.read_snapshot(path, 'v1') == (None, None)
+    snapshot.write_snapshot(sample_frame(), path, 'v1')
+    assert snapshot.read_snapshot(path, 'v2') == (None, None)
+    with open(path, 'wb') as f:
+        f.write(b'not a snapshot')
+    assert snapshot.read_snapshot(path, 'v1') == (None, None)